@@ -0,0 +1,365 @@
+# benchmark.py
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+from metrics import latency_summary
+from threaded_node import StorageNode, send_full, recv_full
+from pack_storage import PackStore
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+COORDINATOR_PORT = 9000  # threaded_node.register_to_network always dials 9000
+
+
+# =========================================================
+# Measurement Helpers
+# =========================================================
+
+# CPU and RSS come from /proc, so they are Linux only. Elsewhere the helpers
+# return None and the results leave those fields out.
+PROC_NOTE = "CPU and RSS fields skipped: /proc is not available on this platform"
+
+
+def process_cpu_seconds(pid):
+    """utime + stime of a process, or None without /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces, so split after the closing paren.
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def total_cpu_seconds(pids):
+    values = [process_cpu_seconds(pid) for pid in pids]
+    return None if None in values else sum(values)
+
+
+def process_peak_rss_mb(pid):
+    """Peak resident set size of a process, or None without /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return 0.0
+
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on {host}:{port} after {timeout}s")
+
+
+# =========================================================
+# File Size Distributions
+# =========================================================
+
+def size_sampler(dist, size_kb, max_size_kb, rng):
+    """Returns a function producing file sizes in bytes."""
+    size = size_kb * 1024
+    max_size = max_size_kb * 1024
+
+    if dist == "fixed":
+        return lambda: size
+    if dist == "uniform":
+        return lambda: rng.randint(1, max_size)
+    if dist == "lognormal":
+        # Median of size_kb with a long tail, capped at max_size_kb: many
+        # small objects and the occasional large one.
+        return lambda: max(1, min(max_size, int(rng.lognormvariate(0, 1.5) * size)))
+    raise ValueError(f"unknown distribution: {dist}")
+
+
+# =========================================================
+# Cluster Processes
+# =========================================================
+
+class LocalCluster:
+    """A coordinator and N storage nodes as localhost subprocesses, run in a
+    scratch directory so their storage/ folders don't touch the repo."""
+
+    def __init__(self, num_nodes, base_port, storage_mb):
+        self.workdir = tempfile.mkdtemp(prefix="cloudkitchen-bench-")
+        self.processes = {}  # name -> Popen
+        self.nodes = []      # (node_id, host, port)
+        self.num_nodes = num_nodes
+        self.base_port = base_port
+        self.storage_mb = storage_mb
+
+    def _spawn(self, name, args):
+        self.processes[name] = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, args[0])] + args[1:],
+            cwd=self.workdir,
+            # Nodes block on their CLI prompt; an open pipe keeps them idle there.
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def start(self):
+        self._spawn("coordinator", ["network_coordinator.py"])
+        wait_for_port("127.0.0.1", COORDINATOR_PORT)
+
+        for i in range(self.num_nodes):
+            node_id = f"bench{i + 1}"
+            port = self.base_port + i
+            self._spawn(node_id, [
+                "threaded_node.py", "--node", node_id, "--port", str(port),
+                "--storage", str(self.storage_mb), "--sendrate", "0", "--recvrate", "0",
+            ])
+            wait_for_port("127.0.0.1", port)
+            self.nodes.append((node_id, "127.0.0.1", port))
+
+    def node_pids(self):
+        return [self.processes[node_id].pid for node_id, _, _ in self.nodes]
+
+    def stop(self):
+        for proc in self.processes.values():
+            proc.terminate()
+        for proc in self.processes.values():
+            proc.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# =========================================================
+# Benchmarks
+# =========================================================
+
+def bench_codec(sizes_kb):
+    """send_full/recv_full throughput over a local socket pair, unthrottled."""
+    results = {}
+    for size_kb in sizes_kb:
+        payload = os.urandom(size_kb * 1024)
+        a, b = socket.socketpair()
+        rounds = max(3, min(200, (64 * 1024) // size_kb))
+        received = []
+
+        def reader():
+            for _ in range(rounds):
+                received.append(len(recv_full(b, 0)))
+
+        t = threading.Thread(target=reader)
+        start = time.perf_counter()
+        t.start()
+        for _ in range(rounds):
+            send_full(a, payload, 0)
+        t.join()
+        elapsed = time.perf_counter() - start
+        a.close()
+        b.close()
+
+        results[f"{size_kb}KB"] = {"rounds": rounds, "mb_per_s": rounds * len(payload) / elapsed / 1024 / 1024}
+    return results
+
+
+def bench_storage_scan(num_files, file_kb, pack_threshold_kb):
+    """Time get_current_storage_size over a directory of num_files files."""
+    scratch = tempfile.mkdtemp(prefix="cloudkitchen-scan-")
+    try:
+        # A node object without the server thread, registration or CLI.
+        node = StorageNode.__new__(StorageNode)
+        node.storage_dir = scratch
+        node.pack_threshold_bytes = pack_threshold_kb * 1024
+        node.pack_store = PackStore(os.path.join(scratch, "packs"))
+        node.local_files = {}
+
+        data = b"x" * (file_kb * 1024)
+        for i in range(num_files):
+            node.store_file(f"{i:032x}", f"file{i}", data)
+
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            node.get_current_storage_size()
+            timings.append(time.perf_counter() - start)
+        return {"files": num_files, "file_kb": file_kb, "packed": file_kb <= pack_threshold_kb,
+                **latency_summary(timings)}
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def bench_registration(count, sink_port):
+    """Latency of [REGISTER] round trips, including the peer broadcast.
+
+    Synthetic nodes all point at one sink listener so the coordinator's
+    broadcast connections succeed and its cost grows with cluster size.
+    """
+    sink = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sink.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sink.bind(("127.0.0.1", sink_port))
+    sink.listen(1024)
+
+    def drain():
+        while True:
+            try:
+                conn, _ = sink.accept()
+            except OSError:
+                return
+            recv_full(conn, 0)
+            conn.close()
+
+    threading.Thread(target=drain, daemon=True).start()
+
+    timings = []
+    for i in range(count):
+        payload = {
+            "node_id": f"synthetic{i}", "host": "127.0.0.1", "port": sink_port,
+            "max_storage_mb": 100, "send_rate_kbps": 0, "recv_rate_kbps": 0,
+        }
+        start = time.perf_counter()
+        s = socket.create_connection(("127.0.0.1", COORDINATOR_PORT))
+        send_full(s, b"[REGISTER]" + json.dumps(payload).encode(), 0)
+        recv_full(s, 0)
+        # The coordinator closes the connection once its broadcast is done.
+        s.recv(1)
+        s.close()
+        timings.append(time.perf_counter() - start)
+
+    sink.close()
+    return latency_summary(timings)
+
+
+def transfer_once(host, port, file_id, size):
+    payload = (
+        b"[FILE_TRANSFER]"
+        + json.dumps({"file_id": file_id, "filename": file_id}).encode()
+        + b"<DATA>"
+        + os.urandom(size)
+    )
+    start = time.perf_counter()
+    s = socket.create_connection((host, port))
+    send_full(s, payload, 0)
+    # Wait for handle_connection to store the file and close its end.
+    s.shutdown(socket.SHUT_WR)
+    s.recv(1)
+    s.close()
+    return time.perf_counter() - start
+
+
+def bench_transfers(cluster, count, concurrency, sampler):
+    """Drive count FILE_TRANSFER frames across the cluster's nodes."""
+    jobs = []
+    for i in range(count):
+        node_id, host, port = cluster.nodes[i % len(cluster.nodes)]
+        jobs.append((host, port, f"{i:032x}", sampler()))
+    total_bytes = sum(job[3] for job in jobs)
+
+    pids = cluster.node_pids()
+    cpu_before = total_cpu_seconds(pids)
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(lambda job: transfer_once(*job), jobs))
+    elapsed = time.perf_counter() - start
+    cpu_after = total_cpu_seconds(pids)
+
+    results = {
+        "transfers": count,
+        "concurrency": concurrency,
+        "total_mb": total_bytes / 1024 / 1024,
+        "mb_per_s": total_bytes / elapsed / 1024 / 1024,
+        **latency_summary(timings),
+    }
+    if cpu_before is not None and cpu_after is not None:
+        results["cpu_s_per_gb"] = (cpu_after - cpu_before) / (total_bytes / 1024 ** 3) if total_bytes else 0.0
+        results["peak_rss_mb"] = max(process_peak_rss_mb(pid) for pid in pids)
+    else:
+        results["note"] = PROC_NOTE
+    return results
+
+
+# =========================================================
+# Regression Comparison
+# =========================================================
+
+def compare(baseline, current, prefix=""):
+    """Prints every numeric metric that exists in both result sets."""
+    for key, value in current.items():
+        if key not in baseline:
+            continue
+        if isinstance(value, dict):
+            compare(baseline[key], value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and baseline[key]:
+            change = (value - baseline[key]) / baseline[key] * 100
+            print(f"  {prefix + key:<40} {baseline[key]:>12.3f} -> {value:>12.3f} ({change:+.1f}%)")
+
+
+# ---------------------------------------------------------
+# Entry Point
+# ---------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Localhost benchmarks for nodes and the coordinator")
+    parser.add_argument("--nodes", type=int, default=3, help="Storage nodes to start (default: 3)")
+    parser.add_argument("--base-port", type=int, default=18800, help="First node port (default: 18800)")
+    parser.add_argument("--transfers", type=int, default=200, help="File transfers to drive (default: 200)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent senders (default: 8)")
+    parser.add_argument("--dist", choices=["fixed", "uniform", "lognormal"], default="lognormal",
+                        help="File size distribution (default: lognormal)")
+    parser.add_argument("--size-kb", type=int, default=32, help="Fixed size / lognormal median in KB (default: 32)")
+    parser.add_argument("--max-size-kb", type=int, default=4096, help="Largest file in KB (default: 4096)")
+    parser.add_argument("--registrations", type=int, default=50, help="Synthetic registrations (default: 50)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for file sizes (default: 1)")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write results JSON")
+    parser.add_argument("--compare", help="Previous results JSON to diff against")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = {
+        "config": vars(args),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    print("⏱  send_full / recv_full ...")
+    results["codec"] = bench_codec([4, 64, 1024, 16384])
+
+    print("⏱  get_current_storage_size ...")
+    results["storage_scan"] = {
+        "loose": bench_storage_scan(2000, 128, 64),
+        "packed": bench_storage_scan(2000, 4, 64),
+    }
+
+    cluster = LocalCluster(args.nodes, args.base_port, storage_mb=1024 * 1024)
+    try:
+        print(f"🚀 Starting coordinator and {args.nodes} nodes ...")
+        cluster.start()
+
+        print(f"⏱  {args.transfers} transfers ({args.dist}) x{args.concurrency} ...")
+        sampler = size_sampler(args.dist, args.size_kb, args.max_size_kb, rng)
+        results["transfers"] = bench_transfers(cluster, args.transfers, args.concurrency, sampler)
+
+        print(f"⏱  {args.registrations} registrations ...")
+        results["registration"] = bench_registration(args.registrations, args.base_port + args.nodes)
+        coordinator_rss = process_peak_rss_mb(cluster.processes["coordinator"].pid)
+        if coordinator_rss is not None:
+            results["coordinator_peak_rss_mb"] = coordinator_rss
+    finally:
+        cluster.stop()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps({k: v for k, v in results.items() if k != "config"}, indent=2))
+    print(f"\n✔ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare}:")
+        compare(baseline, {k: v for k, v in results.items() if k != "config"})
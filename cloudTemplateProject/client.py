@@ -44,6 +44,15 @@ def run_client():
             
         print(f"\nFinal Result: {response.result}")
 
+        if not response.token:
+            return
+
+        # --- Stage 3: Session Token ---
+        # Later calls can present this token instead of repeating login + OTP.
+        print(f"Session token (expires at {response.expires_at}): {response.token}")
+        check = stub.validate_token(cloudsecurity_pb2.TokenRequest(token=response.token), timeout=10)
+        print(f"Token valid: {check.valid} (login={check.login})")
+
 
 if __name__ == '__main__':
     run_client()
\ No newline at end of file
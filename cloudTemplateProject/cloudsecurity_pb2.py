@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x63loudsecurity.proto\x12\x05\x63loud\"*\n\x07Request\x12\r\n\x05login\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"-\n\nOTPRequest\x12\r\n\x05login\x18\x01 \x01(\t\x12\x10\n\x08otp_code\x18\x02 \x01(\t\"\x1a\n\x08Response\x12\x0e\n\x06result\x18\x01 \x01(\t2i\n\x0bUserService\x12(\n\x05login\x12\x0e.cloud.Request\x1a\x0f.cloud.Response\x12\x30\n\nverify_otp\x12\x11.cloud.OTPRequest\x1a\x0f.cloud.Responseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x63loudsecurity.proto\x12\x05\x63loud\"*\n\x07Request\x12\r\n\x05login\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"-\n\nOTPRequest\x12\r\n\x05login\x18\x01 \x01(\t\x12\x10\n\x08otp_code\x18\x02 \x01(\t\"\x1d\n\x0cTokenRequest\x12\r\n\x05token\x18\x01 \x01(\t\"=\n\x08Response\x12\x0e\n\x06result\x18\x01 \x01(\t\x12\r\n\x05token\x18\x02 \x01(\t\x12\x12\n\nexpires_at\x18\x03 \x01(\x03\"A\n\rTokenResponse\x12\r\n\x05valid\x18\x01 \x01(\x08\x12\r\n\x05login\x18\x02 \x01(\t\x12\x12\n\nexpires_at\x18\x03 \x01(\x03\x32\xcf\x02\n\x0bUserService\x12(\n\x05login\x12\x0e.cloud.Request\x1a\x0f.cloud.Response\x12\x30\n\nverify_otp\x12\x11.cloud.OTPRequest\x1a\x0f.cloud.Response\x12;\n\x0evalidate_token\x12\x13.cloud.TokenRequest\x1a\x14.cloud.TokenResponse\x12/\n\x07refresh\x12\x13.cloud.TokenRequest\x1a\x0f.cloud.Response\x12.\n\x06logout\x12\x13.cloud.TokenRequest\x1a\x0f.cloud.Response\x12\x46\n\x15validate_token_stream\x12\x13.cloud.TokenRequest\x1a\x14.cloud.TokenResponse(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,8 +35,12 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_REQUEST']._serialized_end=72
   _globals['_OTPREQUEST']._serialized_start=74
   _globals['_OTPREQUEST']._serialized_end=119
-  _globals['_RESPONSE']._serialized_start=121
-  _globals['_RESPONSE']._serialized_end=147
-  _globals['_USERSERVICE']._serialized_start=149
-  _globals['_USERSERVICE']._serialized_end=254
+  _globals['_TOKENREQUEST']._serialized_start=121
+  _globals['_TOKENREQUEST']._serialized_end=150
+  _globals['_RESPONSE']._serialized_start=152
+  _globals['_RESPONSE']._serialized_end=213
+  _globals['_TOKENRESPONSE']._serialized_start=215
+  _globals['_TOKENRESPONSE']._serialized_end=280
+  _globals['_USERSERVICE']._serialized_start=283
+  _globals['_USERSERVICE']._serialized_end=618
 # @@protoc_insertion_point(module_scope)
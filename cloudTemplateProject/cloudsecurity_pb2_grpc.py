@@ -45,6 +45,26 @@ class UserServiceStub(object):
                 request_serializer=cloudsecurity__pb2.OTPRequest.SerializeToString,
                 response_deserializer=cloudsecurity__pb2.Response.FromString,
                 _registered_method=True)
+        self.validate_token = channel.unary_unary(
+                '/cloud.UserService/validate_token',
+                request_serializer=cloudsecurity__pb2.TokenRequest.SerializeToString,
+                response_deserializer=cloudsecurity__pb2.TokenResponse.FromString,
+                _registered_method=True)
+        self.refresh = channel.unary_unary(
+                '/cloud.UserService/refresh',
+                request_serializer=cloudsecurity__pb2.TokenRequest.SerializeToString,
+                response_deserializer=cloudsecurity__pb2.Response.FromString,
+                _registered_method=True)
+        self.logout = channel.unary_unary(
+                '/cloud.UserService/logout',
+                request_serializer=cloudsecurity__pb2.TokenRequest.SerializeToString,
+                response_deserializer=cloudsecurity__pb2.Response.FromString,
+                _registered_method=True)
+        self.validate_token_stream = channel.stream_stream(
+                '/cloud.UserService/validate_token_stream',
+                request_serializer=cloudsecurity__pb2.TokenRequest.SerializeToString,
+                response_deserializer=cloudsecurity__pb2.TokenResponse.FromString,
+                _registered_method=True)
 
 
 class UserServiceServicer(object):
@@ -63,6 +83,31 @@ class UserServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def validate_token(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def refresh(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def logout(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def validate_token_stream(self, request_iterator, context):
+        """For gateways: validate many tokens over one stream, answered in request order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_UserServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -76,6 +121,26 @@ def add_UserServiceServicer_to_server(servicer, server):
                     request_deserializer=cloudsecurity__pb2.OTPRequest.FromString,
                     response_serializer=cloudsecurity__pb2.Response.SerializeToString,
             ),
+            'validate_token': grpc.unary_unary_rpc_method_handler(
+                    servicer.validate_token,
+                    request_deserializer=cloudsecurity__pb2.TokenRequest.FromString,
+                    response_serializer=cloudsecurity__pb2.TokenResponse.SerializeToString,
+            ),
+            'refresh': grpc.unary_unary_rpc_method_handler(
+                    servicer.refresh,
+                    request_deserializer=cloudsecurity__pb2.TokenRequest.FromString,
+                    response_serializer=cloudsecurity__pb2.Response.SerializeToString,
+            ),
+            'logout': grpc.unary_unary_rpc_method_handler(
+                    servicer.logout,
+                    request_deserializer=cloudsecurity__pb2.TokenRequest.FromString,
+                    response_serializer=cloudsecurity__pb2.Response.SerializeToString,
+            ),
+            'validate_token_stream': grpc.stream_stream_rpc_method_handler(
+                    servicer.validate_token_stream,
+                    request_deserializer=cloudsecurity__pb2.TokenRequest.FromString,
+                    response_serializer=cloudsecurity__pb2.TokenResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'cloud.UserService', rpc_method_handlers)
@@ -141,3 +206,111 @@ class UserService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def validate_token(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/cloud.UserService/validate_token',
+            cloudsecurity__pb2.TokenRequest.SerializeToString,
+            cloudsecurity__pb2.TokenResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def refresh(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/cloud.UserService/refresh',
+            cloudsecurity__pb2.TokenRequest.SerializeToString,
+            cloudsecurity__pb2.Response.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def logout(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/cloud.UserService/logout',
+            cloudsecurity__pb2.TokenRequest.SerializeToString,
+            cloudsecurity__pb2.Response.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def validate_token_stream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/cloud.UserService/validate_token_stream',
+            cloudsecurity__pb2.TokenRequest.SerializeToString,
+            cloudsecurity__pb2.TokenResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,185 @@
+# credential_store.py
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CredentialStore:
+    """Looks up (email, password_hash) for a login."""
+
+    def lookup(self, login):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+
+class SqliteCredentialStore(CredentialStore):
+    """Credential store backed by a SQLite index built from the 'credentials' CSV.
+
+    Users are loaded lazily, one row per lookup, through a bounded LRU cache.
+    When the CSV changes, a new index is built under the next version number
+    (credentials.db.1, .2, ...) and lookups switch to it, while in-flight ones
+    finish on the old file. Nothing is ever written over an open database,
+    which Windows would refuse; old versions are deleted once no connection
+    holds them.
+    """
+
+    def __init__(self, csv_path, db_path=None, cache_size=10000, poll_interval=2.0):
+        self.csv_path = csv_path
+        self.db_base = db_path or csv_path + '.db'
+        self.cache_size = cache_size
+        self.poll_interval = poll_interval
+
+        self.cache = OrderedDict()  # login -> (email, password_hash) or None
+        self.cache_lock = threading.Lock()
+        self.local = threading.local()
+        self.generation = 0
+        self.csv_stat = None
+
+        # Reuse the newest index left by an earlier run; any others are stale.
+        versions = self._index_versions()
+        self.db_path = self._version_path(versions[-1]) if versions else None
+        self.stale_paths = [self._version_path(version) for version in versions[:-1]]
+        if os.path.exists(self.db_base):
+            self.stale_paths.append(self.db_base)  # unversioned index from older releases
+        self.reload()
+
+    # --- Index Build ---
+    # The index records the (mtime, size) of the CSV it was built from and is
+    # rebuilt whenever they differ, in either direction: a CSV restored from a
+    # backup can carry an older timestamp than the index.
+    def _csv_stat(self):
+        stat = os.stat(self.csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _version_path(self, version):
+        return f'{self.db_base}.{version}'
+
+    def _index_versions(self):
+        directory = os.path.dirname(self.db_base) or '.'
+        prefix = os.path.basename(self.db_base) + '.'
+        return sorted(int(name[len(prefix):]) for name in os.listdir(directory)
+                      if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+    def _indexed_stat(self):
+        """The CSV (mtime, size) the current index was built from, or None."""
+        if self.db_path is None or not os.path.exists(self.db_path):
+            return None
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute('SELECT csv_mtime_ns, csv_size FROM source').fetchone()
+        except sqlite3.DatabaseError:
+            # An index from before the source table existed, or a damaged file.
+            return None
+        finally:
+            conn.close()
+        return tuple(row) if row else None
+
+    def _build_index(self, csv_stat):
+        """Builds the next index version. Returns its path."""
+        versions = self._index_versions()
+        db_path = self._version_path(versions[-1] + 1 if versions else 1)
+        tmp_path = db_path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.execute('CREATE TABLE users (login TEXT PRIMARY KEY, email TEXT, password_hash TEXT) WITHOUT ROWID')
+            conn.execute('CREATE TABLE source (csv_mtime_ns INTEGER, csv_size INTEGER)')
+            # Stat taken before reading, so an edit made during the build
+            # shows up as a mismatch on the next reload.
+            conn.execute('INSERT INTO source VALUES (?, ?)', csv_stat)
+            with open(self.csv_path, 'r') as file:
+                rows = (parts for parts in (line.strip().split(',') for line in file) if len(parts) == 3)
+                conn.executemany('INSERT OR REPLACE INTO users VALUES (?, ?, ?)', rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+        # The new name is unused, so this never replaces an open file.
+        os.replace(tmp_path, db_path)
+        return db_path
+
+    def _remove_stale(self):
+        for path in list(self.stale_paths):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still open by a thread that hasn't looked anything up since
+                # the switch (Windows); try again on the next poll.
+                continue
+            self.stale_paths.remove(path)
+
+    def reload(self):
+        """Rebuilds the index if the CSV changed since it was built. Returns
+        True if the store switched to a different index."""
+        csv_stat = self._csv_stat()
+        if csv_stat == self.csv_stat:
+            self._remove_stale()
+            return False
+
+        db_path = self.db_path
+        if self._indexed_stat() != csv_stat:
+            db_path = self._build_index(csv_stat)
+            if self.db_path is not None:
+                self.stale_paths.append(self.db_path)
+
+        self.csv_stat = csv_stat
+        with self.cache_lock:
+            self.db_path = db_path
+            self.cache.clear()
+            self.generation += 1
+        self._remove_stale()
+        return True
+
+    def start_watcher(self):
+        threading.Thread(target=self._watch_loop, daemon=True).start()
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self.reload():
+                    print(f"Reloaded credentials: {self.count()} users.")
+            except Exception as e:
+                print(f"WARNING: credentials reload failed: {e}")
+
+    # --- Lookups ---
+    def _connection(self):
+        # sqlite3 connections are per-thread; reopen after a reload switched files.
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.generation != self.generation:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(self.db_path)
+            self.local.conn = conn
+            self.local.generation = self.generation
+        return conn
+
+    def lookup(self, login):
+        with self.cache_lock:
+            if login in self.cache:
+                self.cache.move_to_end(login)
+                return self.cache[login]
+            generation = self.generation
+
+        row = self._connection().execute(
+            'SELECT email, password_hash FROM users WHERE login = ?', (login,)).fetchone()
+        entry = tuple(row) if row else None
+
+        with self.cache_lock:
+            # Don't cache a row read from an index that was replaced mid-lookup.
+            if generation == self.generation:
+                self.cache[login] = entry
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        return entry
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM users').fetchone()[0]
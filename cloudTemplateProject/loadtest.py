@@ -0,0 +1,343 @@
+# loadtest.py
+import argparse
+import asyncio
+import json
+import os
+import queue
+import re
+import secrets
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent import futures
+
+import grpc
+import cloudsecurity_pb2
+import cloudsecurity_pb2_grpc
+import server
+import utils
+from metrics import latency_summary
+from rate_limit import RateLimitInterceptor, AioRateLimitInterceptor
+
+OTP_PATTERN = re.compile(r"Your OTP code is: (\d{6})")
+
+
+# =========================================================
+# Local SMTP Stand-in
+# =========================================================
+class OTPMailbox:
+    """OTPs captured by the fake SMTP server, keyed by recipient email."""
+
+    def __init__(self):
+        self.otps = {}
+        self.condition = threading.Condition()
+
+    def deliver(self, email, otp):
+        with self.condition:
+            self.otps[email] = otp
+            self.condition.notify_all()
+
+    def discard(self, email):
+        """Drops an OTP left over from an earlier login, e.g. one that arrived
+        after that flow stopped waiting for it."""
+        with self.condition:
+            self.otps.pop(email, None)
+
+    def wait(self, email, timeout):
+        with self.condition:
+            if self.condition.wait_for(lambda: email in self.otps, timeout):
+                return self.otps.pop(email)
+        return None
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, QUIT."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 loadtest ESMTP")
+        recipient = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-loadtest")
+                self.reply("250 AUTH PLAIN")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                recipient = None
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command.split(":", 1)[1].strip().strip("<>")
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    body.append(data_line.decode(errors="replace"))
+                match = OTP_PATTERN.search("".join(body))
+                if match and recipient:
+                    self.server.mailbox.deliver(recipient, match.group(1))
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start_fake_smtp(port):
+    smtp = FakeSMTPServer(("127.0.0.1", port), FakeSMTPHandler)
+    smtp.mailbox = OTPMailbox()
+    threading.Thread(target=smtp.serve_forever, daemon=True).start()
+    return smtp
+
+
+# =========================================================
+# Synthetic Users
+# =========================================================
+# Synthetic users are recognised by their email domain, so cleaning up never
+# touches a real account, whatever its login.
+LOAD_USER_DOMAIN = "@loadtest.local"
+
+
+def is_load_user(line):
+    parts = line.strip().split(",")
+    return len(parts) == 3 and parts[1].endswith(LOAD_USER_DOMAIN)
+
+
+def remove_users(path):
+    """Removes every synthetic user from a credentials file."""
+    if not os.path.exists(path):
+        return
+    with open(path) as file:
+        kept = [line for line in file if not is_load_user(line)]
+    tmp_path = path + ".loadtest.tmp"
+    with open(tmp_path, "w") as file:
+        file.writelines(kept)
+    os.replace(tmp_path, path)
+
+
+def write_users(path, count, password):
+    """Adds count synthetic users to a credentials file, replacing any left
+    behind by an earlier run. Returns [(login, email)]."""
+    remove_users(path)
+
+    # One bcrypt hash shared by every user: creating them stays fast, while
+    # the server still pays a full checkpw per login.
+    hashed_pwd = utils.hash_password(password)
+    users = [(f"loaduser{i}", f"loaduser{i}{LOAD_USER_DOMAIN}") for i in range(count)]
+    with open(path, "a") as file:
+        for login, email in users:
+            file.write(f"{login},{email},{hashed_pwd}\n")
+    return users
+
+
+# =========================================================
+# In-Process Auth Server
+# =========================================================
+# Both return (server, port); the caller must hold on to the server object,
+# since a grpc.Server that is garbage collected shuts down.
+def start_sync_server(workers, rate_limit):
+    grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers),
+                              interceptors=[RateLimitInterceptor()] if rate_limit else [])
+    cloudsecurity_pb2_grpc.add_UserServiceServicer_to_server(server.UserServiceSkeleton(), grpc_server)
+    port = grpc_server.add_insecure_port("127.0.0.1:0")
+    grpc_server.start()
+    return grpc_server, port
+
+
+def start_aio_server(workers, rate_limit):
+    ready = threading.Event()
+    bound = {}
+
+    async def serve():
+        grpc_server = grpc.aio.server(interceptors=[AioRateLimitInterceptor()] if rate_limit else [])
+        servicer = server.AioUserServiceSkeleton(futures.ThreadPoolExecutor(max_workers=workers))
+        cloudsecurity_pb2_grpc.add_UserServiceServicer_to_server(servicer, grpc_server)
+        bound["server"] = grpc_server
+        bound["port"] = grpc_server.add_insecure_port("127.0.0.1:0")
+        await grpc_server.start()
+        ready.set()
+        await grpc_server.wait_for_termination()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    ready.wait()
+    return bound["server"], bound["port"]
+
+
+# =========================================================
+# Login -> OTP -> verify Flow
+# =========================================================
+def run_flow(stub, login, email, password, mailbox, otp_timeout):
+    """Returns (stage timings in seconds, error category or None)."""
+    timings = {}
+    mailbox.discard(email)
+    try:
+        start = time.perf_counter()
+        response = stub.login(cloudsecurity_pb2.Request(login=login, password=password), timeout=30)
+        timings["login"] = time.perf_counter() - start
+        if "successfully" not in response.result:
+            return timings, "unauthorized" if response.result.startswith("Unauthorized") else "otp_email_failed"
+
+        start = time.perf_counter()
+        otp = mailbox.wait(email, otp_timeout)
+        timings["otp_wait"] = time.perf_counter() - start
+        if otp is None:
+            return timings, "otp_not_received"
+
+        start = time.perf_counter()
+        response = stub.verify_otp(cloudsecurity_pb2.OTPRequest(login=login, otp_code=otp), timeout=30)
+        timings["verify"] = time.perf_counter() - start
+        if not response.token:
+            return timings, "verify_failed"
+    except grpc.RpcError as e:
+        return timings, f"grpc_{e.code().name.lower()}"
+    return timings, None
+
+
+def run_load(target, users, password, mailbox, flows, rate, concurrency, otp_timeout):
+    """Issues flows at a fixed rate (open loop). Flow latency is measured from
+    the scheduled start, so time spent queued behind a saturated server counts."""
+    channel = grpc.insecure_channel(target)
+    stub = cloudsecurity_pb2_grpc.UserServiceStub(channel)
+
+    # A user is never in two flows at once, otherwise their OTPs would collide.
+    free_users = queue.Queue()
+    for user in users:
+        free_users.put(user)
+
+    stage_samples = {"login": [], "otp_wait": [], "verify": [], "flow": []}
+    errors = Counter()
+    lock = threading.Lock()
+
+    def one_flow(scheduled):
+        login, email = free_users.get()
+        try:
+            timings, error = run_flow(stub, login, email, password, mailbox, otp_timeout)
+        finally:
+            free_users.put((login, email))
+        with lock:
+            for stage, seconds in timings.items():
+                stage_samples[stage].append(seconds)
+            if error:
+                errors[error] += 1
+            else:
+                stage_samples["flow"].append(time.perf_counter() - scheduled)
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i in range(flows):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one_flow, scheduled)
+    elapsed = time.perf_counter() - start
+    channel.close()
+
+    succeeded = len(stage_samples["flow"])
+    return {
+        "flows": flows,
+        "succeeded": succeeded,
+        "elapsed_s": elapsed,
+        "offered_rate": rate,
+        "throughput_per_s": succeeded / elapsed,
+        "latency": {stage: latency_summary(samples) for stage, samples in stage_samples.items()},
+        "errors": dict(errors),
+    }
+
+
+def report(*lines):
+    # Server chatter goes to the redirected stdout; the report goes to the terminal.
+    for line in lines:
+        print(line, file=sys.__stdout__)
+    sys.__stdout__.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive concurrent login -> verify_otp flows against the auth server")
+    parser.add_argument("--server", choices=["sync", "aio", "external"], default="sync",
+                        help="Run the server in-process (sync or aio) or target a running one (default: sync)")
+    parser.add_argument("--target", default="localhost:51234", help="Address of an external server (default: localhost:51234)")
+    parser.add_argument("--credentials", help="Credentials file to add users to (required for external: the server's own file)")
+    parser.add_argument("--users", type=int, default=100, help="Synthetic users (default: 100)")
+    parser.add_argument("--flows", type=int, default=500, help="Flows to run (default: 500)")
+    parser.add_argument("--rate", type=float, default=50, help="Flows started per second (default: 50)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Max flows in flight (default: 64)")
+    parser.add_argument("--workers", type=int, default=10, help="In-process server worker threads (default: 10)")
+    parser.add_argument("--rate-limit", action="store_true", help="Keep the rate limiter on for in-process servers")
+    parser.add_argument("--smtp-port", type=int, default=2525, help="Fake SMTP server port (default: 2525)")
+    parser.add_argument("--otp-timeout", type=float, default=10, help="Seconds to wait for an OTP email (default: 10)")
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show server output")
+    args = parser.parse_args()
+
+    # A fresh password per run: the synthetic users never share a known one.
+    password = secrets.token_urlsafe(16)
+
+    if args.server == "external" and not args.credentials:
+        parser.error("--server external needs --credentials, the file the server reads its users from")
+    smtp = start_fake_smtp(args.smtp_port)
+
+    if args.server == "external":
+        credentials = args.credentials
+        users = write_users(credentials, args.users, password)
+        target = args.target
+        report(f"Added {len(users)} users to {credentials}. The server must be started with",
+               f"  CLOUD_SMTP_HOST=127.0.0.1 CLOUD_SMTP_PORT={args.smtp_port} CLOUD_SMTP_TLS=0 "
+               "python server.py --rate-limit-exempt 127.0.0.1 --rate-limit-exempt [::1]",
+               "(or --no-rate-limit), so one load generator isn't rejected as an abusive peer.")
+        # Give the credential store's watcher time to pick up the new users.
+        time.sleep(3)
+    else:
+        if not args.verbose:
+            sys.stdout = open(os.devnull, "w")
+        credentials = args.credentials or os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "credentials")
+        users = write_users(credentials, args.users, password)
+
+        # Point OTP mail at the stand-in for this process.
+        utils.smtp_host, utils.smtp_port, utils.smtp_use_tls = "127.0.0.1", args.smtp_port, False
+        server.load_credentials(credentials)
+        start = start_aio_server if args.server == "aio" else start_sync_server
+        auth_server, port = start(args.workers, args.rate_limit)
+        target = f"127.0.0.1:{port}"
+
+    report(f"🚀 {args.flows} flows at {args.rate}/s, {args.concurrency} in flight, {len(users)} users -> {target} ({args.server})")
+    try:
+        results = run_load(target, users, password, smtp.mailbox, args.flows, args.rate, args.concurrency, args.otp_timeout)
+    finally:
+        remove_users(credentials)
+        report(f"Removed the {len(users)} load test users from {credentials}")
+    results["config"] = vars(args)
+
+    report(f"✔ {results['succeeded']}/{results['flows']} flows in {results['elapsed_s']:.1f}s "
+           f"= {results['throughput_per_s']:.1f} flows/s")
+    for stage, summary in results["latency"].items():
+        if summary["count"]:
+            report(f"  {stage:<9} n={summary['count']:<6} p50 {summary['p50_ms']:8.1f}ms  "
+                   f"p90 {summary['p90_ms']:8.1f}ms  p99 {summary['p99_ms']:8.1f}ms")
+    if results["errors"]:
+        report("❌ errors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(results["errors"].items())))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        report(f"Results saved to {args.output}")
@@ -1,6 +1,29 @@
 # params.py
+import os
+import secrets
+
 # --- Gmail SMTP Configuration ---
 # NOTE: Replace these with your actual email and App Password
 from_email = "etan.john@ictuniversity.edu.cm"
 app_password = "wbtg qkzd zxng jfmj" 
-# Example App Password structure: "abcd efgh ijkl mnop"
\ No newline at end of file
+# Example App Password structure: "abcd efgh ijkl mnop"
+
+# Overridable so load tests can point OTP mail at a local stand-in (see loadtest.py)
+smtp_host = os.environ.get("CLOUD_SMTP_HOST", "smtp.gmail.com")
+smtp_port = int(os.environ.get("CLOUD_SMTP_PORT", "587"))
+smtp_use_tls = os.environ.get("CLOUD_SMTP_TLS", "1") != "0"
+
+# --- Session Token Configuration ---
+# Set a fixed secret so tokens stay valid across restarts. Logout and refresh
+# revocations are kept in memory by each server process, so other processes
+# sharing the secret (or this one after a restart) still accept a revoked
+# token until it expires.
+token_secret = os.environ.get("CLOUD_TOKEN_SECRET")
+if not token_secret:
+    # Never fall back to a fixed string: anyone who knows it could forge tokens.
+    token_secret = secrets.token_hex(32)
+    print("⚠️ CLOUD_TOKEN_SECRET is not set; using a random secret. Tokens will not be "
+          "accepted by other server processes or after a restart.")
+token_ttl_seconds = 3600
+# Refreshing can't keep a session alive longer than this after the login.
+session_max_seconds = 24 * 3600
@@ -0,0 +1,181 @@
+# rate_limit.py
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote
+
+import grpc
+import metrics
+
+# --- Metrics ---
+RATE_LIMITED = metrics.counter("auth_rate_limited", "Calls rejected by the rate limiter", ("method", "kind"))
+
+
+class GCRALimiter:
+    """Generic cell rate limiter: `rate` requests per `period` seconds with
+    bursts of up to `burst`. Keeps one float per key in a bounded LRU map."""
+
+    def __init__(self, rate, period, burst, max_keys=100000):
+        self.interval = period / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.max_keys = max_keys
+        self.tat = OrderedDict()  # key -> theoretical arrival time
+        self.lock = threading.Lock()
+
+    def allow(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tat = max(self.tat.get(key, now), now)
+            if tat - self.tolerance > now:
+                return False
+
+            self.tat[key] = tat + self.interval
+            self.tat.move_to_end(key)
+            # Evicting the least recently seen key at worst forgives that key's
+            # remaining debt; it never blocks anyone.
+            if len(self.tat) > self.max_keys:
+                self.tat.popitem(last=False)
+            return True
+
+
+# --- Default Limits ---
+# method -> [(key kind, rate, period seconds, burst)]
+# verify_otp is keyed by login so a 6-digit code can't be brute forced from many peers.
+# Streaming methods are checked once per request message, not per stream.
+DEFAULT_LIMITS = {
+    'login': [('peer', 30, 60, 10), ('login', 5, 60, 5)],
+    'verify_otp': [('peer', 30, 60, 10), ('login', 5, 300, 5)],
+    'validate_token': [('peer', 6000, 60, 200)],
+    'validate_token_stream': [('peer', 6000, 60, 200)],
+    'refresh': [('peer', 60, 60, 20)],
+    'logout': [('peer', 60, 60, 20)],
+}
+
+
+def peer_host(peer):
+    """'ipv4:127.0.0.1:54321' -> '127.0.0.1', 'ipv6:%5B::1%5D:54321' -> '[::1]'."""
+    address = peer.split(':', 1)[1] if ':' in peer else peer
+    address = unquote(address)  # grpc percent-encodes the brackets of IPv6 peers
+    return address.rsplit(':', 1)[0]
+
+
+class RateLimiter:
+    """Per-method set of limiters shared by the sync and asyncio interceptors.
+    Calls from exempt_hosts (as returned by peer_host) are never limited."""
+
+    def __init__(self, limits=DEFAULT_LIMITS, exempt_hosts=()):
+        self.exempt_hosts = frozenset(exempt_hosts)
+        self.limiters = {
+            method: [(kind, GCRALimiter(rate, period, burst)) for kind, rate, period, burst in rules]
+            for method, rules in limits.items()
+        }
+
+    def limited_method(self, handler_call_details, handler):
+        """Returns the method name if calls to it are rate limited, else None."""
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        if handler is None or method not in self.limiters:
+            return None
+        if handler.unary_unary is None and handler.stream_stream is None:
+            return None
+        return method
+
+    def check(self, method, request, peer):
+        """Returns True if the call may proceed."""
+        host = peer_host(peer)
+        if host in self.exempt_hosts:
+            return True
+        for kind, limiter in self.limiters[method]:
+            key = host if kind == 'peer' else request.login
+            if not limiter.allow(key):
+                # Counted, not logged: a flood of rejections must stay cheap.
+                RATE_LIMITED.labels(method, kind).inc()
+                return False
+        return True
+
+
+class RateLimitInterceptor(grpc.ServerInterceptor):
+    """Rejects over-limit calls with RESOURCE_EXHAUSTED before the servicer
+    runs, so abusive traffic never reaches bcrypt, SMTP or OTP checks."""
+
+    def __init__(self, limits=DEFAULT_LIMITS, exempt_hosts=()):
+        self.rate_limiter = RateLimiter(limits, exempt_hosts)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        method = self.rate_limiter.limited_method(handler_call_details, handler)
+        if method is None:
+            return handler
+
+        if handler.stream_stream is not None:
+            behavior = handler.stream_stream
+
+            def limited_stream(request_iterator, context):
+                def checked():
+                    for request in request_iterator:
+                        if not self.rate_limiter.check(method, request, context.peer()):
+                            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Too many requests. Try again later.')
+                        yield request
+                return behavior(checked(), context)
+
+            return grpc.stream_stream_rpc_method_handler(
+                limited_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        behavior = handler.unary_unary
+
+        def limited(request, context):
+            if not self.rate_limiter.check(method, request, context.peer()):
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Too many requests. Try again later.')
+            return behavior(request, context)
+
+        return grpc.unary_unary_rpc_method_handler(
+            limited,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+
+
+class AioRateLimitInterceptor(grpc.aio.ServerInterceptor):
+    """grpc.aio version of RateLimitInterceptor."""
+
+    def __init__(self, limits=DEFAULT_LIMITS, exempt_hosts=()):
+        self.rate_limiter = RateLimiter(limits, exempt_hosts)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        method = self.rate_limiter.limited_method(handler_call_details, handler)
+        if method is None:
+            return handler
+
+        if handler.stream_stream is not None:
+            behavior = handler.stream_stream
+
+            async def limited_stream(request_iterator, context):
+                async def checked():
+                    async for request in request_iterator:
+                        if not self.rate_limiter.check(method, request, context.peer()):
+                            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Too many requests. Try again later.')
+                        yield request
+                async for response in behavior(checked(), context):
+                    yield response
+
+            return grpc.stream_stream_rpc_method_handler(
+                limited_stream,
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer,
+            )
+
+        behavior = handler.unary_unary
+
+        async def limited(request, context):
+            if not self.rate_limiter.check(method, request, context.peer()):
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'Too many requests. Try again later.')
+            return await behavior(request, context)
+
+        return grpc.unary_unary_rpc_method_handler(
+            limited,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
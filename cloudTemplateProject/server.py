@@ -1,38 +1,50 @@
 # server.py
+import argparse
+import asyncio
 import grpc
 from concurrent import futures
 import cloudsecurity_pb2
 import cloudsecurity_pb2_grpc
 import bcrypt
 import os
-from utils import send_otp, verify_otp 
+import threading
+import metrics  # shared with the storage nodes; `pip install -e .` from the repo root
+from credential_store import SqliteCredentialStore
+from rate_limit import RateLimitInterceptor, AioRateLimitInterceptor
+from utils import send_otp, verify_otp, issue_token, decode_token, revoke_token, otp_store, revoked_tokens
 
-# --- Global Data Stores ---
-CREDENTIALS = {} # login -> hashed_pwd
-EMAILS = {}      # login -> email
+# --- Metrics ---
+BCRYPT_SECONDS = metrics.histogram("auth_bcrypt_seconds", "Time spent in bcrypt.checkpw")
+SMTP_SECONDS = metrics.histogram("auth_smtp_seconds", "Time spent generating and emailing an OTP")
+LOGIN_RESULTS = metrics.counter("auth_logins", "login calls by outcome", ("outcome",))
+metrics.gauge("auth_otp_store_size", "OTPs issued but not yet used").set_function(lambda: len(otp_store))
+metrics.gauge("auth_revoked_tokens", "Revoked session tokens not yet expired").set_function(lambda: len(revoked_tokens))
 
-# Load credentials once at startup
-def load_credentials():
-    global CREDENTIALS, EMAILS
-    file_path = 'credentials'
+# --- Global Data Store ---
+CREDENTIAL_STORE = None  # SqliteCredentialStore over the 'credentials' file
+
+# Index the credentials file at startup and watch it for new users
+def load_credentials(file_path='credentials'):
+    global CREDENTIAL_STORE
     try:
-        with open(file_path, 'r') as file:
-            for line in file:
-                # Ensure the line has 3 parts (username, email, hash)
-                parts = line.strip().split(',')
-                if len(parts) == 3:
-                    username, email, password_hash = parts
-                    CREDENTIALS[username] = password_hash
-                    EMAILS[username] = email
-        if not CREDENTIALS:
+        CREDENTIAL_STORE = SqliteCredentialStore(file_path)
+        user_count = CREDENTIAL_STORE.count()
+        if not user_count:
             print("WARNING: 'credentials' file is empty.")
-        print(f"Loaded {len(CREDENTIALS)} users from credentials file.")
+        print(f"Loaded {user_count} users from credentials file.")
+        CREDENTIAL_STORE.start_watcher()
     except FileNotFoundError:
         print("CRITICAL: 'credentials' file not found. Run utils.py to create it.")
         # Use os._exit(1) for immediate termination if a critical file is missing
         os._exit(1) 
 
 class UserServiceSkeleton(cloudsecurity_pb2_grpc.UserServiceServicer):
+
+    def __init__(self, max_streams=2):
+        # An open token stream holds a pool thread for as long as it lasts, so
+        # the thread pool server only admits a few and keeps the rest of the
+        # workers for login. Gateways that stream should use the --aio server.
+        self.stream_slots = threading.BoundedSemaphore(max_streams)
     
     def login(self, request, context) -> cloudsecurity_pb2.Response:
         print(f'\n[LOGIN] Incoming request: {request.login}')
@@ -40,17 +52,23 @@ class UserServiceSkeleton(cloudsecurity_pb2_grpc.UserServiceServicer):
         login = request.login
         pwd = request.password
         
-        hashed_pwd = CREDENTIALS.get(login)
-        email = EMAILS.get(login)
+        email, hashed_pwd = CREDENTIAL_STORE.lookup(login) or (None, None)
         
         # 1. Check if user exists and password is correct
-        if (hashed_pwd and 
-            bcrypt.checkpw(pwd.encode('utf-8'), hashed_pwd.encode('utf-8'))):
+        password_ok = False
+        if hashed_pwd:
+            with BCRYPT_SECONDS.time():
+                password_ok = bcrypt.checkpw(pwd.encode('utf-8'), hashed_pwd.encode('utf-8'))
+
+        if password_ok:
             # 2. Password correct, send OTP
-            result = send_otp(email, login)
+            with SMTP_SECONDS.time():
+                sent, result = send_otp(email, login)
+            LOGIN_RESULTS.labels("otp_sent" if sent else "otp_failed").inc()
         else:
             # Prevent timing attacks by giving a generic unauthorized message
             result = "Unauthorized: Invalid username or password."
+            LOGIN_RESULTS.labels("unauthorized").inc()
             
         return cloudsecurity_pb2.Response(result=result)
 
@@ -59,15 +77,96 @@ class UserServiceSkeleton(cloudsecurity_pb2_grpc.UserServiceServicer):
         
         # 3. Verify the OTP using the utility function
         if verify_otp(request.login, request.otp_code):
-            result = "Authentication SUCCESSFUL. Welcome!"
-        else:
-            result = "Authentication FAILED. Invalid OTP."
-            
-        return cloudsecurity_pb2.Response(result=result)
+            # 4. Issue a session token so the client can skip bcrypt + OTP next time
+            token, expires_at = issue_token(request.login)
+            return cloudsecurity_pb2.Response(result="Authentication SUCCESSFUL. Welcome!",
+                                              token=token, expires_at=expires_at)
+
+        return cloudsecurity_pb2.Response(result="Authentication FAILED. Invalid OTP.")
+
+    def _session(self, token):
+        """The token payload if it is valid and its user still exists, else None."""
+        payload = decode_token(token)
+        if payload is None or CREDENTIAL_STORE.lookup(payload["sub"]) is None:
+            return None
+        return payload
+
+    def validate_token(self, request, context) -> cloudsecurity_pb2.TokenResponse:
+        payload = self._session(request.token)
+        if payload is None:
+            return cloudsecurity_pb2.TokenResponse(valid=False)
+        return cloudsecurity_pb2.TokenResponse(valid=True, login=payload["sub"], expires_at=payload["exp"])
+
+    def refresh(self, request, context) -> cloudsecurity_pb2.Response:
+        # A user removed from the credentials file can't refresh their way on.
+        payload = self._session(request.token)
+        if payload is None:
+            return cloudsecurity_pb2.Response(result="Refresh FAILED. Invalid or expired token.")
+
+        # The old token is revoked so each refresh hands out exactly one live
+        # token; a concurrent refresh that revoked it first wins.
+        if not revoke_token(payload):
+            return cloudsecurity_pb2.Response(result="Refresh FAILED. Invalid or expired token.")
+        token, expires_at = issue_token(payload["sub"], payload["auth_time"])
+        return cloudsecurity_pb2.Response(result="Token refreshed.", token=token, expires_at=expires_at)
+
+    def logout(self, request, context) -> cloudsecurity_pb2.Response:
+        payload = decode_token(request.token)
+        if payload is None:
+            return cloudsecurity_pb2.Response(result="Logout FAILED. Invalid or expired token.")
+
+        print(f'\n[LOGOUT] Revoking session for: {payload["sub"]}')
+        revoke_token(payload)
+        return cloudsecurity_pb2.Response(result="Logged out.")
+
+    def validate_token_stream(self, request_iterator, context):
+        if not self.stream_slots.acquire(blocking=False):
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'Too many token streams on this server. Use the asyncio server for streaming.')
+        try:
+            for request in request_iterator:
+                yield self.validate_token(request, context)
+        finally:
+            self.stream_slots.release()
+
+class AioUserServiceSkeleton(UserServiceSkeleton):
+    """grpc.aio servicer. bcrypt and SMTP run on a thread pool so the event
+    loop keeps serving while they block; token checks run inline."""
+
+    def __init__(self, executor):
+        # Streams don't tie up a thread here, so they are not capped.
+        self.executor = executor
 
-def run_server():
+    async def _blocking(self, method, request, context):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, method, request, context)
+
+    async def login(self, request, context) -> cloudsecurity_pb2.Response:
+        return await self._blocking(super().login, request, context)
+
+    async def verify_otp(self, request, context) -> cloudsecurity_pb2.Response:
+        return await self._blocking(super().verify_otp, request, context)
+
+    async def validate_token(self, request, context) -> cloudsecurity_pb2.TokenResponse:
+        return super().validate_token(request, context)
+
+    async def refresh(self, request, context) -> cloudsecurity_pb2.Response:
+        return super().refresh(request, context)
+
+    async def logout(self, request, context) -> cloudsecurity_pb2.Response:
+        return super().logout(request, context)
+
+    async def validate_token_stream(self, request_iterator, context):
+        async for request in request_iterator:
+            yield UserServiceSkeleton.validate_token(self, request, context)
+
+# Rate limiting: exempt_hosts skips the limits for trusted peers (e.g. a load
+# generator), rate_limit=False turns them off entirely.
+def run_server(rate_limit=True, exempt_hosts=()):
     load_credentials() # Load users before starting the server
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    # Over-limit calls are rejected in the interceptor, before bcrypt or SMTP run
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10),
+                         interceptors=[RateLimitInterceptor(exempt_hosts=exempt_hosts)] if rate_limit else [])
     cloudsecurity_pb2_grpc.add_UserServiceServicer_to_server(UserServiceSkeleton(), server)
     server.add_insecure_port('[::]:51234')
     
@@ -76,5 +175,37 @@ def run_server():
     print('[OK]')
     server.wait_for_termination() # Keep the main thread alive
 
+async def serve_aio(blocking_workers, rate_limit=True, exempt_hosts=()):
+    # Concurrency is no longer capped by the worker count: only bcrypt and SMTP
+    # occupy a pool thread, everything else is multiplexed on the event loop.
+    executor = futures.ThreadPoolExecutor(max_workers=blocking_workers)
+    server = grpc.aio.server(interceptors=[AioRateLimitInterceptor(exempt_hosts=exempt_hosts)] if rate_limit else [])
+    cloudsecurity_pb2_grpc.add_UserServiceServicer_to_server(AioUserServiceSkeleton(executor), server)
+    server.add_insecure_port('[::]:51234')
+
+    print('Starting asyncio Server on port 51234 ............', end='')
+    await server.start()
+    print('[OK]')
+    await server.wait_for_termination()
+
+def run_aio_server(blocking_workers=64, rate_limit=True, exempt_hosts=()):
+    load_credentials() # Load users before starting the server
+    asyncio.run(serve_aio(blocking_workers, rate_limit, exempt_hosts))
+
 if __name__ == '__main__':
-    run_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aio", action="store_true", help="Run the grpc.aio server instead of the thread pool server")
+    parser.add_argument("--workers", type=int, default=64, help="Threads for bcrypt/SMTP work in --aio mode (default: 64)")
+    parser.add_argument("--metricsport", type=int, default=0, help="Serve /metrics and /traces on this port (default: off)")
+    parser.add_argument("--rate-limit-exempt", action="append", default=[], metavar="HOST",
+                        help="Peer host the rate limits don't apply to, e.g. a load generator's 127.0.0.1 (repeatable)")
+    parser.add_argument("--no-rate-limit", action="store_true", help="Turn the rate limiter off (load testing only)")
+    args = parser.parse_args()
+
+    if args.metricsport:
+        metrics.start_http_server(args.metricsport)
+
+    if args.aio:
+        run_aio_server(args.workers, not args.no_rate_limit, args.rate_limit_exempt)
+    else:
+        run_server(not args.no_rate_limit, args.rate_limit_exempt)
\ No newline at end of file
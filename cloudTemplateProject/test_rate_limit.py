@@ -0,0 +1,79 @@
+# test_rate_limit.py
+import unittest
+from types import SimpleNamespace
+
+from rate_limit import GCRALimiter, RateLimiter, RATE_LIMITED, peer_host
+
+
+class GCRALimiterTest(unittest.TestCase):
+    def test_burst_then_steady_rate(self):
+        limiter = GCRALimiter(rate=1, period=1, burst=3)
+        self.assertEqual([limiter.allow("k", now=0) for _ in range(4)], [True, True, True, False])
+        # One request's worth of capacity comes back per interval.
+        self.assertFalse(limiter.allow("k", now=0.99))
+        self.assertTrue(limiter.allow("k", now=1.0))
+        self.assertFalse(limiter.allow("k", now=1.0))
+
+    def test_idle_key_refills_to_burst_only(self):
+        limiter = GCRALimiter(rate=1, period=1, burst=3)
+        for _ in range(3):
+            limiter.allow("k", now=0)
+        results = [limiter.allow("k", now=100) for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+
+    def test_keys_are_independent(self):
+        limiter = GCRALimiter(rate=1, period=60, burst=1)
+        self.assertTrue(limiter.allow("a", now=0))
+        self.assertFalse(limiter.allow("a", now=0))
+        self.assertTrue(limiter.allow("b", now=0))
+
+    def test_least_recently_seen_key_is_evicted(self):
+        limiter = GCRALimiter(rate=1, period=60, burst=2, max_keys=2)
+        limiter.allow("a", now=0)
+        limiter.allow("b", now=0)
+        limiter.allow("b", now=0)
+        limiter.allow("a", now=0)  # a is now the most recently seen
+        limiter.allow("c", now=0)
+        self.assertEqual(list(limiter.tat), ["a", "c"])
+        # Eviction forgives b's debt rather than blocking it.
+        self.assertFalse(limiter.allow("a", now=0))
+        self.assertTrue(limiter.allow("b", now=0))
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_peer_host(self):
+        self.assertEqual(peer_host("ipv4:127.0.0.1:54321"), "127.0.0.1")
+        self.assertEqual(peer_host("ipv6:[::1]:54321"), "[::1]")
+        self.assertEqual(peer_host("ipv6:%5B::1%5D:54321"), "[::1]")
+
+    def test_login_limit_applies_across_peers(self):
+        limiter = RateLimiter({"verify_otp": [("peer", 100, 60, 100), ("login", 1, 60, 2)]})
+        request = SimpleNamespace(login="bob")
+        rejected = RATE_LIMITED.labels("verify_otp", "login")
+        before = rejected.samples("x", ())[0][2]
+
+        self.assertTrue(limiter.check("verify_otp", request, "ipv4:10.0.0.1:1"))
+        self.assertTrue(limiter.check("verify_otp", request, "ipv4:10.0.0.2:1"))
+        self.assertFalse(limiter.check("verify_otp", request, "ipv4:10.0.0.3:1"))
+        self.assertTrue(limiter.check("verify_otp", SimpleNamespace(login="alice"), "ipv4:10.0.0.3:1"))
+        self.assertEqual(rejected.samples("x", ())[0][2] - before, 1)
+
+    def test_exempt_hosts_skip_every_limit(self):
+        limiter = RateLimiter({"login": [("peer", 1, 60, 1), ("login", 1, 60, 1)]}, exempt_hosts=["127.0.0.1"])
+        request = SimpleNamespace(login="bob")
+        for _ in range(5):
+            self.assertTrue(limiter.check("login", request, "ipv4:127.0.0.1:1"))
+        self.assertTrue(limiter.check("login", request, "ipv4:10.0.0.1:1"))
+        self.assertFalse(limiter.check("login", request, "ipv4:10.0.0.1:1"))
+
+    def test_unlimited_methods_pass_through(self):
+        limiter = RateLimiter({"login": [("peer", 1, 60, 1)]})
+        details = SimpleNamespace(method="/UserService/logout")
+        handler = SimpleNamespace(unary_unary=lambda request, context: None, stream_stream=None)
+        self.assertIsNone(limiter.limited_method(details, handler))
+        details.method = "/UserService/login"
+        self.assertEqual(limiter.limited_method(details, handler), "login")
+
+
+if __name__ == "__main__":
+    unittest.main()
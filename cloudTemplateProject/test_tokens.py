@@ -0,0 +1,107 @@
+# test_tokens.py
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import cloudsecurity_pb2
+import server
+import utils
+
+
+class TokenTest(unittest.TestCase):
+    def test_round_trip(self):
+        token, expires_at = utils.issue_token("bob")
+        payload = utils.decode_token(token)
+        self.assertEqual(payload["sub"], "bob")
+        self.assertEqual(payload["exp"], expires_at)
+
+    def test_tampered_tokens_are_rejected(self):
+        token, _ = utils.issue_token("bob")
+        payload_b64, signature_b64 = token.split(".")
+        forged_payload = utils._b64encode(b'{"sub":"admin","exp":9999999999,"jti":"x","auth_time":9999999999}')
+
+        self.assertIsNone(utils.decode_token(f"{forged_payload}.{signature_b64}"))
+        self.assertIsNone(utils.decode_token(f"{payload_b64}.{utils._b64encode(b'0' * 32)}"))
+        self.assertIsNone(utils.decode_token(payload_b64))
+        self.assertIsNone(utils.decode_token("not a token"))
+        self.assertIsNone(utils.decode_token(None))
+
+    def test_expired_token_is_rejected(self):
+        token, expires_at = utils.issue_token("bob")
+        with mock.patch("utils.time.time", return_value=expires_at):
+            self.assertIsNone(utils.decode_token(token))
+
+    def test_session_lifetime_is_capped(self):
+        now = int(time.time())
+        token, expires_at = utils.issue_token("bob", auth_time=now - utils.session_max_seconds + 60)
+        self.assertLessEqual(expires_at, now + 60)
+        self.assertIsNotNone(utils.decode_token(token))
+
+        token, _ = utils.issue_token("bob", auth_time=now - utils.session_max_seconds)
+        self.assertIsNone(utils.decode_token(token))
+
+    def test_token_can_be_revoked_once(self):
+        token, _ = utils.issue_token("bob")
+        payload = utils.decode_token(token)
+        self.assertTrue(utils.revoke_token(payload))
+        self.assertFalse(utils.revoke_token(payload))
+        self.assertIsNone(utils.decode_token(token))
+
+    def test_expired_revocations_are_pruned(self):
+        utils.revoke_token({"jti": "old", "exp": time.time() - 1})
+        utils.revoke_token({"jti": "new", "exp": time.time() + 60})
+        self.assertNotIn("old", utils.revoked_tokens)
+        self.assertIn("new", utils.revoked_tokens)
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp(prefix="tokens-test-")
+        self.credentials = os.path.join(self.workdir, "credentials")
+        with open(self.credentials, "w") as file:
+            file.write("bob,bob@example.com,unused-hash\n")
+        server.CREDENTIAL_STORE = server.SqliteCredentialStore(self.credentials)
+        self.service = server.UserServiceSkeleton()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def refresh(self, token):
+        return self.service.refresh(cloudsecurity_pb2.TokenRequest(token=token), None)
+
+    def test_concurrent_refreshes_issue_one_token(self):
+        token, _ = utils.issue_token("bob")
+        start = threading.Barrier(16)
+        results = []
+
+        def refresh():
+            start.wait()
+            results.append(self.refresh(token).token)
+
+        threads = [threading.Thread(target=refresh) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sum(1 for new_token in results if new_token), 1)
+
+    def test_refresh_keeps_auth_time(self):
+        auth_time = int(time.time()) - 600
+        token, _ = utils.issue_token("bob", auth_time=auth_time)
+        refreshed = self.refresh(token)
+        self.assertEqual(utils.decode_token(refreshed.token)["auth_time"], auth_time)
+
+    def test_removed_user_cannot_refresh(self):
+        token, _ = utils.issue_token("bob")
+        with open(self.credentials, "w") as file:
+            file.write("alice,alice@example.com,unused-hash\n")
+        server.CREDENTIAL_STORE.reload()
+        self.assertEqual(self.refresh(token).token, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,14 +2,31 @@
 import bcrypt
 import random
 import smtplib
+import base64
+import hashlib
+import heapq
+import hmac
+import json
+import secrets
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 # Ensure params.py exists and contains valid email/app_password
-from params import from_email, app_password 
+from params import (from_email, app_password, token_secret, token_ttl_seconds, session_max_seconds,
+                    smtp_host, smtp_port, smtp_use_tls)
 
 # Dictionary to temporarily store generated OTPs (login -> otp_code)
 otp_store = {}
 
+# Revoked session token ids (jti -> expires_at). Entries are pruned once the
+# token would have expired anyway, so the set stays bounded by the TTL;
+# revoked_expiry is a heap of (expires_at, jti) so pruning only touches
+# the entries that are due. Revocation lives in this process only.
+revoked_tokens = {}
+revoked_expiry = []
+revoked_lock = threading.Lock()
+
 def hash_password(password):
     """Hashes a password using bcrypt."""
     return bcrypt.hashpw(password.encode('utf-8'), 
@@ -33,7 +50,65 @@ def verify_otp(login, otp_code):
         return True
     return False
 
-def send_otp(to_email, login) -> str:
+# --- Session Tokens ---
+# Format: base64url(json payload) + "." + base64url(HMAC-SHA256(payload)).
+# Validation needs only the shared secret, not a password or OTP round.
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload_b64):
+    return hmac.new(token_secret.encode("utf-8"), payload_b64.encode("ascii"), hashlib.sha256).digest()
+
+def issue_token(login, auth_time=None):
+    """Issues a signed session token. auth_time is when the user last passed
+    password + OTP; refreshed tokens carry it over so a session can't be
+    extended past session_max_seconds. Returns (token, expires_at)."""
+    now = int(time.time())
+    auth_time = now if auth_time is None else auth_time
+    expires_at = min(now + token_ttl_seconds, auth_time + session_max_seconds)
+    payload = json.dumps({"sub": login, "exp": expires_at, "jti": secrets.token_hex(8), "auth_time": auth_time},
+                         separators=(",", ":")).encode("utf-8")
+    payload_b64 = _b64encode(payload)
+    return f"{payload_b64}.{_b64encode(_sign(payload_b64))}", expires_at
+
+def decode_token(token):
+    """Returns the token payload if the signature, expiry and revocation
+    checks pass, otherwise None."""
+    try:
+        payload_b64, signature_b64 = token.split(".")
+        if not hmac.compare_digest(_sign(payload_b64), _b64decode(signature_b64)):
+            return None
+        payload = json.loads(_b64decode(payload_b64))
+    except (ValueError, AttributeError):
+        return None
+
+    now = time.time()
+    if payload["exp"] <= now or payload.get("auth_time", 0) + session_max_seconds <= now:
+        return None
+    if payload["jti"] in revoked_tokens:
+        return None
+    return payload
+
+def revoke_token(payload):
+    """Adds a decoded token to the revocation set. Returns False if it was
+    already revoked, so only one caller can consume a token."""
+    now = time.time()
+    with revoked_lock:
+        while revoked_expiry and revoked_expiry[0][0] <= now:
+            _, jti = heapq.heappop(revoked_expiry)
+            del revoked_tokens[jti]
+        if payload["jti"] in revoked_tokens:
+            return False
+        revoked_tokens[payload["jti"]] = payload["exp"]
+        heapq.heappush(revoked_expiry, (payload["exp"], payload["jti"]))
+        return True
+
+def send_otp(to_email, login) -> tuple:
+    """Returns (sent, message for the client)."""
     # 1. Generate and Store OTP
     otp = generate_otp()
     store_otp(login, otp)
@@ -51,10 +126,11 @@ def send_otp(to_email, login) -> str:
 
     try:
         # 3. Connect and Send Email
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            print(f"Starting TLS session on smtp.gmail.com:587 .........", end='')
-            server.starttls()
-            print('[OK]')
+        with smtplib.SMTP(smtp_host, smtp_port) as server:
+            if smtp_use_tls:
+                print(f"Starting TLS session on {smtp_host}:{smtp_port} .........", end='')
+                server.starttls()
+                print('[OK]')
             print(f"Login to the server with {from_email} .........", end='')
             server.login(from_email, app_password)
             print('[OK]')
@@ -62,11 +138,11 @@ def send_otp(to_email, login) -> str:
             server.send_message(msg)
             print('[OK]')
             print(f"OTP data sent to {to_email} successfully!")
-            return f"OTP data sent to your email: {to_email} successfully!"
+            return True, f"OTP data sent to your email: {to_email} successfully!"
     except Exception as e:
         print(f"Failed to send email: {e}")
         # Return a concise error name to the client
-        return f"Failed to send OTP email: {e.__class__.__name__}" 
+        return False, f"Failed to send OTP email: {e.__class__.__name__}"
 
 if __name__ == '__main__':
     # --- Setup Logic: RUN THIS ONCE to create 'credentials' file ---
@@ -0,0 +1,327 @@
+# metrics.py
+
+import bisect
+import collections
+import itertools
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# =========================================================
+# Striped Aggregation
+# =========================================================
+# Values are spread over a fixed number of stripes, each with its own lock.
+# A thread is given a stripe round-robin the first time it records, so
+# concurrent recorders rarely share a lock, and memory stays the same no
+# matter how many short-lived (per-connection) threads come and go.
+
+_STRIPES = 16
+_stripe_counter = itertools.count()
+_thread_stripe = threading.local()
+
+
+def _stripe_index():
+    try:
+        return _thread_stripe.index
+    except AttributeError:
+        _thread_stripe.index = next(_stripe_counter) % _STRIPES
+        return _thread_stripe.index
+
+
+class _Striped:
+    def __init__(self, size):
+        self._stripes = [([0] * size, threading.Lock()) for _ in range(_STRIPES)]
+
+    def stripe(self):
+        """(slots, lock) for the calling thread; update slots under the lock."""
+        return self._stripes[_stripe_index()]
+
+    def snapshot(self):
+        total = [0] * len(self._stripes[0][0])
+        for slots, lock in self._stripes:
+            with lock:
+                for i, value in enumerate(slots):
+                    total[i] += value
+        return total
+
+
+# =========================================================
+# Metric Types
+# =========================================================
+
+class _CounterChild:
+    def __init__(self):
+        self._striped = _Striped(1)
+
+    def inc(self, amount=1):
+        slots, lock = self._striped.stripe()
+        with lock:
+            slots[0] += amount
+
+    def samples(self, name, labels):
+        return [(name + "_total", labels, self._striped.snapshot()[0])]
+
+
+class _GaugeChild:
+    """Either tracked with inc/dec or computed at scrape time by set_function."""
+
+    def __init__(self):
+        self._striped = _Striped(1)
+        self._function = None
+
+    def inc(self, amount=1):
+        slots, lock = self._striped.stripe()
+        with lock:
+            slots[0] += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self._function = function
+
+    def samples(self, name, labels):
+        value = self._function() if self._function else self._striped.snapshot()[0]
+        return [(name, labels, value)]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        # One count per bucket plus +Inf, then sum and count.
+        self._striped = _Striped(len(buckets) + 3)
+
+    def observe(self, value):
+        bucket = bisect.bisect_left(self._buckets, value)
+        slots, lock = self._striped.stripe()
+        with lock:
+            slots[bucket] += 1
+            slots[-2] += value
+            slots[-1] += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labels):
+        slots = self._striped.snapshot()
+        result = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + [float("inf")], slots):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            result.append((name + "_bucket", labels + (("le", le),), cumulative))
+        result.append((name + "_sum", labels, slots[-2]))
+        result.append((name + "_count", labels, slots[-1]))
+        return result
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Unlabelled metrics expose their single child's inc/observe/...
+            # directly, so recording costs no extra attribute lookup.
+            self._default = self._new_child()
+            for attr in dir(self._default):
+                if not attr.startswith("_") and attr != "samples":
+                    setattr(self, attr, getattr(self._default, attr))
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        if not self.labelnames:
+            return self._default.samples(self.name, ())
+        result = []
+        for values, child in list(self._children.items()):
+            result.extend(child.samples(self.name, tuple(zip(self.labelnames, values))))
+        return result
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+# Seconds: 0.5ms .. 30s
+DEFAULT_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self._buckets = sorted(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self._buckets)
+
+
+# =========================================================
+# Registry
+# =========================================================
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        # Modules may be imported more than once (e.g. by the simulator), so
+        # asking for an existing metric returns it instead of failing.
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def exposition(self):
+        """All metrics in the Prometheus text format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            family = metric.name + "_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {family} {metric.documentation}")
+            lines.append(f"# TYPE {family} {metric.kind}")
+            for sample_name, labels, value in metric.samples():
+                if labels:
+                    label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels)
+                    lines.append(f"{sample_name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+# =========================================================
+# Trace Spans
+# =========================================================
+# Finished spans go into a bounded ring buffer (deque appends are atomic)
+# and their durations into a span_seconds histogram.
+
+RECENT_SPANS = collections.deque(maxlen=1000)
+SPAN_SECONDS = histogram("span_seconds", "Duration of traced operations", ("span",))
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def record_span(name, start, trace_id=None, **attributes):
+    """Records a span that began at time.perf_counter() value `start`."""
+    duration = time.perf_counter() - start
+    SPAN_SECONDS.labels(name).observe(duration)
+    RECENT_SPANS.append({
+        "span": name,
+        "trace_id": trace_id or new_trace_id(),
+        "start": time.time() - duration,
+        "duration_s": duration,
+        **attributes,
+    })
+
+
+# =========================================================
+# Latency Summaries
+# =========================================================
+# Shared by the benchmark, simulator and auth load test reports.
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    """Seconds in, milliseconds out."""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p90_ms": percentile(samples, 90) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+# =========================================================
+# HTTP Endpoint
+# =========================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = REGISTRY.exposition().encode()
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/traces":
+            body = json.dumps(list(RECENT_SPANS), default=str).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would otherwise print a line each.
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serves /metrics (Prometheus text) and /traces (recent spans as JSON)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📊 Metrics at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -1,12 +1,23 @@
 # coordinator.py
 
+import argparse
 import socket
 import threading
 import json
+import time
+
+import metrics
 
 # node_id -> {"host": str, "port": int, "max_storage_mb": int, "send_rate_kbps": int, "recv_rate_kbps": int}
 connected_nodes = {} 
 
+# --- Metrics ---
+REGISTRATION_SECONDS = metrics.histogram("coordinator_registration_seconds", "Time to handle a [REGISTER], including the broadcast")
+BROADCAST_SECONDS = metrics.histogram("coordinator_broadcast_seconds", "Time to push one peer list to every node")
+BROADCAST_FAILURES = metrics.counter("coordinator_broadcast_failures", "Peer updates that could not be delivered")
+CONNECTED_NODES = metrics.gauge("coordinator_connected_nodes", "Nodes in the membership list")
+CONNECTED_NODES.set_function(lambda: len(connected_nodes))
+
 
 # ---------------------------------------------------------
 # Length-Prefixed Send & Receive
@@ -42,7 +53,8 @@ def broadcast_peers(exclude_node_id=None):
     
     payload = b"[PEER_UPDATE]" + json.dumps(peer_list_to_send).encode()
 
-    for node_id, info in connected_nodes.items():
+    start = time.perf_counter()
+    for node_id, info in list(connected_nodes.items()):
         if node_id == exclude_node_id:
             continue
         host = info["host"]
@@ -54,13 +66,15 @@ def broadcast_peers(exclude_node_id=None):
             s.close()
         except Exception:
             # Simple error handling for failed peer connection
-            pass
+            BROADCAST_FAILURES.inc()
+    BROADCAST_SECONDS.observe(time.perf_counter() - start)
 
 
 # ---------------------------------------------------------
 # Client Handler
 # ---------------------------------------------------------
 def client_handler(conn, addr):
+    start = time.perf_counter()
     data = recv_full(conn)
     if not data:
         conn.close()
@@ -87,6 +101,7 @@ def client_handler(conn, addr):
             
             # 2. Notify all *other* nodes about the new peer
             broadcast_peers(exclude_node_id=node_id)
+            REGISTRATION_SECONDS.observe(time.perf_counter() - start)
         
         except Exception as e:
             print(f"[-] Error processing registration: {e}")
@@ -97,19 +112,37 @@ def client_handler(conn, addr):
 # ---------------------------------------------------------
 # Main Server
 # ---------------------------------------------------------
-def start_server(host="127.0.0.1", port=9000):
-    print("========================================")
-    print(f" Main Network Coordinator running at {host}:{port}")
-    print("========================================\n")
-
+def bind_server(host="127.0.0.1", port=9000):
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Allow quick restarts on the same port
     s.bind((host, port))
     s.listen()
+    return s
 
+
+def serve_forever(s):
     while True:
-        conn, addr = s.accept()
+        try:
+            conn, addr = s.accept()
+        except OSError:
+            # Listening socket was closed
+            return
         threading.Thread(target=client_handler, args=(conn, addr)).start()
 
 
+def start_server(host="127.0.0.1", port=9000):
+    print("========================================")
+    print(f" Main Network Coordinator running at {host}:{port}")
+    print("========================================\n")
+
+    serve_forever(bind_server(host, port))
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--metricsport", type=int, default=0, help="Serve /metrics and /traces on this port (default: off)")
+    args = parser.parse_args()
+
+    if args.metricsport:
+        metrics.start_http_server(args.metricsport)
     start_server()
\ No newline at end of file
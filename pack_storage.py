@@ -0,0 +1,302 @@
+# pack_storage.py
+
+import os
+import json
+import struct
+import threading
+
+# =========================================================
+# Pack File Layout
+# =========================================================
+# A node's small files are appended to large segment files instead of
+# getting one file (and one inode) each. Every record in a segment is:
+#
+#   [kind: 1 byte][meta_len: 2 bytes][data_len: 4 bytes][meta][data]
+#
+# where meta is JSON {"file_id": ..., "filename": ...}. A delete is a
+# tombstone record with no data. The offset index is rebuilt by scanning
+# record headers at startup, so there is no separate index file to keep
+# in sync with the segments.
+
+RECORD_HEADER = struct.Struct(">BHI")
+RECORD_PUT = 1
+RECORD_DELETE = 2
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".pack"
+
+
+class PackStore:
+    def __init__(self, pack_dir, max_segment_mb=64, compact_ratio=0.5, compact_interval=30):
+        self.pack_dir = pack_dir
+        self.max_segment_bytes = max_segment_mb * 1024 * 1024
+        self.compact_ratio = compact_ratio
+        self.compact_interval = compact_interval
+
+        self.index = {}          # file_id -> (segment_no, data_offset, data_len, filename, record_len)
+        self.tombstones = {}     # file_id -> (segment_no, filename, record_len) for deletes still on disk
+        self.segment_sizes = {}  # segment_no -> bytes on disk
+        self.dead_bytes = {}     # segment_no -> bytes held by deleted/overwritten records
+        self.active_segment = 1
+        self.lock = threading.Lock()
+        self.compact_lock = threading.Lock()  # one compaction at a time
+        self.compactor_stopped = threading.Event()
+
+        os.makedirs(self.pack_dir, exist_ok=True)
+        self._load_segments()
+
+    # ---------------------------------------------------------
+    # Startup: rebuild the offset index from segment headers
+    # ---------------------------------------------------------
+    def _segment_path(self, segment_no):
+        return os.path.join(self.pack_dir, f"{SEGMENT_PREFIX}{segment_no:05d}{SEGMENT_SUFFIX}")
+
+    def _load_segments(self):
+        segments = []
+        for name in os.listdir(self.pack_dir):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+
+        for segment_no in sorted(segments):
+            self._scan_segment(segment_no)
+
+        if segments:
+            self.active_segment = max(segments)
+        else:
+            self.segment_sizes[self.active_segment] = 0
+            self.dead_bytes[self.active_segment] = 0
+
+    def _scan_segment(self, segment_no):
+        path = self._segment_path(segment_no)
+        self.segment_sizes[segment_no] = 0
+        self.dead_bytes[segment_no] = 0
+
+        with open(path, "r+b") as f:
+            end = os.fstat(f.fileno()).st_size
+            offset = 0
+            while offset + RECORD_HEADER.size <= end:
+                f.seek(offset)
+                kind, meta_len, data_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                record_len = RECORD_HEADER.size + meta_len + data_len
+                if offset + record_len > end:
+                    break
+                meta = json.loads(f.read(meta_len))
+                self._apply_record(segment_no, kind, meta, offset + RECORD_HEADER.size + meta_len, data_len, record_len)
+                offset += record_len
+
+            if offset < end:
+                # A crash mid-append left a partial record behind; drop it.
+                print(f"⚠️ Truncating partial record in {os.path.basename(path)} at offset {offset}")
+                f.truncate(offset)
+
+        self.segment_sizes[segment_no] = offset
+
+    def _apply_record(self, segment_no, kind, meta, data_offset, data_len, record_len):
+        file_id = meta["file_id"]
+        previous = self.index.pop(file_id, None)
+        if previous is not None:
+            self.dead_bytes[previous[0]] += previous[4]
+        self.tombstones.pop(file_id, None)
+
+        if kind == RECORD_PUT:
+            self.index[file_id] = (segment_no, data_offset, data_len, meta["filename"], record_len)
+        else:
+            # Tombstones are dead weight as soon as they are written.
+            self.tombstones[file_id] = (segment_no, meta["filename"], record_len)
+            self.dead_bytes[segment_no] += record_len
+
+    # ---------------------------------------------------------
+    # Appending
+    # ---------------------------------------------------------
+    @staticmethod
+    def _encode_record(kind, file_id, filename, data=b""):
+        """Returns (record bytes, meta length)."""
+        meta = json.dumps({"file_id": file_id, "filename": filename}).encode()
+        return RECORD_HEADER.pack(kind, len(meta), len(data)) + meta + data, len(meta)
+
+    def _append(self, kind, file_id, filename, data=b""):
+        record, meta_len = self._encode_record(kind, file_id, filename, data)
+
+        if (self.segment_sizes[self.active_segment] > 0 and
+                self.segment_sizes[self.active_segment] + len(record) > self.max_segment_bytes):
+            self.active_segment += 1
+            self.segment_sizes[self.active_segment] = 0
+            self.dead_bytes[self.active_segment] = 0
+
+        offset = self.segment_sizes[self.active_segment]
+        with open(self._segment_path(self.active_segment), "ab") as f:
+            f.write(record)
+        self.segment_sizes[self.active_segment] += len(record)
+
+        self._apply_record(self.active_segment, kind, {"file_id": file_id, "filename": filename},
+                           offset + RECORD_HEADER.size + meta_len, len(data), len(record))
+
+    def put(self, file_id, filename, data: bytes):
+        """Appends a file to the active segment, replacing any older copy."""
+        with self.lock:
+            self._append(RECORD_PUT, file_id, filename, data)
+
+    def put_many(self, entries):
+        """Appends several (file_id, filename, data) entries under one lock hold."""
+        with self.lock:
+            for file_id, filename, data in entries:
+                self._append(RECORD_PUT, file_id, filename, data)
+
+    def delete(self, file_id):
+        """Writes a tombstone for file_id. Returns False if it is not stored."""
+        with self.lock:
+            entry = self.index.get(file_id)
+            if entry is None:
+                return False
+            self._append(RECORD_DELETE, file_id, entry[3])
+            return True
+
+    # ---------------------------------------------------------
+    # Reading
+    # ---------------------------------------------------------
+    def contains(self, file_id):
+        return file_id in self.index
+
+    def get(self, file_id) -> bytes:
+        # The read itself happens outside the lock. Records never change in
+        # place; if compaction removes the segment first, the entry has moved.
+        while True:
+            with self.lock:
+                entry = self.index.get(file_id)
+            if entry is None:
+                return None
+            segment_no, data_offset, data_len = entry[:3]
+            try:
+                with open(self._segment_path(segment_no), "rb") as f:
+                    f.seek(data_offset)
+                    return f.read(data_len)
+            except FileNotFoundError:
+                with self.lock:
+                    if self.index.get(file_id) == entry:
+                        raise
+
+    def files(self):
+        """Returns file_id -> filename for every live entry."""
+        with self.lock:
+            return {file_id: entry[3] for file_id, entry in self.index.items()}
+
+    def total_size(self):
+        """Bytes used on disk by all segments, without walking the directory."""
+        with self.lock:
+            return sum(self.segment_sizes.values())
+
+    # ---------------------------------------------------------
+    # Compaction
+    # ---------------------------------------------------------
+    def compact(self):
+        """Rewrites sealed segments whose reclaimable fraction exceeds compact_ratio.
+
+        Live records are copied to a new segment and the old segment file is
+        removed. Returns the number of bytes reclaimed.
+        """
+        reclaimed = 0
+        with self.compact_lock:
+            with self.lock:
+                candidates = [
+                    segment_no for segment_no, size in self.segment_sizes.items()
+                    if segment_no != self.active_segment and size > 0
+                    and self._reclaimable(segment_no) / size >= self.compact_ratio
+                ]
+            for segment_no in candidates:
+                reclaimed += self._compact_segment(segment_no)
+
+        if reclaimed:
+            print(f"\n🧹 Compacted pack segments, reclaimed {reclaimed // 1024}KB")
+        return reclaimed
+
+    def _keeps_tombstones(self, segment_no):
+        # A tombstone must survive while an older segment could still hold
+        # the PUT it cancels, otherwise a restart would resurrect the file.
+        return any(other < segment_no for other in self.segment_sizes)
+
+    def _reclaimable(self, segment_no):
+        """Dead bytes that compacting the segment would actually free."""
+        dead = self.dead_bytes[segment_no]
+        if self._keeps_tombstones(segment_no):
+            dead -= sum(record_len for tomb_segment, _, record_len in self.tombstones.values()
+                        if tomb_segment == segment_no)
+        return dead
+
+    def _reserve_segment(self):
+        """Seals the active segment and returns a new segment number that sorts
+        before the next active one, so anything written later still wins when
+        the index is rebuilt at startup."""
+        if self.segment_sizes[self.active_segment] > 0:
+            self.active_segment += 1
+        reserved = self.active_segment
+        self.active_segment += 1
+        for segment_no in (reserved, self.active_segment):
+            self.segment_sizes[segment_no] = 0
+            self.dead_bytes[segment_no] = 0
+        return reserved
+
+    def _compact_segment(self, segment_no):
+        with self.lock:
+            live = [(file_id, entry) for file_id, entry in self.index.items() if entry[0] == segment_no]
+            tombstones = [(file_id, tombstone) for file_id, tombstone in self.tombstones.items()
+                          if tombstone[0] == segment_no]
+            # Only live data is worth a segment of its own; with nothing to
+            # copy the active segment is left open.
+            target = self._reserve_segment() if live else None
+
+        # Copy without the lock: sealed segments are never appended to, and the
+        # target isn't referenced by the index until the swap below.
+        moved = []  # (file_id, old entry, new entry)
+        size = 0
+        if live:
+            with open(self._segment_path(segment_no), "rb") as src, \
+                    open(self._segment_path(target), "ab") as dst:
+                for file_id, entry in live:
+                    _, data_offset, data_len, filename, _ = entry
+                    src.seek(data_offset)
+                    record, meta_len = self._encode_record(RECORD_PUT, file_id, filename, src.read(data_len))
+                    dst.write(record)
+                    moved.append((file_id, entry, (target, size + RECORD_HEADER.size + meta_len, data_len, filename, len(record))))
+                    size += len(record)
+
+        with self.lock:
+            if live:
+                self.segment_sizes[target] = size
+                for file_id, old_entry, new_entry in moved:
+                    if self.index.get(file_id) == old_entry:
+                        self.index[file_id] = new_entry
+                    else:
+                        # Overwritten or deleted while we were copying it.
+                        self.dead_bytes[target] += new_entry[4]
+
+            # Tombstones that are still needed are small: re-append them to the
+            # active segment, which also sorts after everything they cancel.
+            keep_tombstones = self._keeps_tombstones(segment_no)
+            for file_id, tombstone in tombstones:
+                if self.tombstones.get(file_id) != tombstone:
+                    continue  # the file was stored again since
+                del self.tombstones[file_id]
+                if keep_tombstones:
+                    self._append(RECORD_DELETE, file_id, tombstone[1])
+                    size += tombstone[2]
+
+            old_size = self.segment_sizes.pop(segment_no)
+            self.dead_bytes.pop(segment_no)
+
+        # Readers that looked up the old location before the swap either
+        # still hold the file open or retry against the new entry.
+        os.remove(self._segment_path(segment_no))
+        return old_size - size
+
+    def start_compactor(self):
+        threading.Thread(target=self._compactor_loop, daemon=True).start()
+
+    def stop_compactor(self):
+        self.compactor_stopped.set()
+
+    def _compactor_loop(self):
+        while not self.compactor_stopped.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print("❌ Pack compaction failed:", e)
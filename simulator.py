@@ -0,0 +1,236 @@
+# simulator.py
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import network_coordinator
+from metrics import latency_summary
+from threaded_node import StorageNode
+
+try:
+    import resource
+except ImportError:  # POSIX only; the report then leaves out peak RSS
+    resource = None
+
+
+# =========================================================
+# Simulated Node with Injectable Faults
+# =========================================================
+class DelayedSocket:
+    """Wraps an outgoing connection so every message on it, in either
+    direction, arrives `latency` seconds late: requests are held before they
+    are sent and replies after they are received."""
+
+    def __init__(self, sock, latency):
+        self._sock = sock
+        self._latency = latency
+        self._sending = None
+
+    def sendall(self, data):
+        if self._sending is not True:
+            self._sending = True
+            time.sleep(self._latency)
+        return self._sock.sendall(data)
+
+    def recv(self, size):
+        data = self._sock.recv(size)
+        if self._sending is not False:
+            self._sending = False
+            time.sleep(self._latency)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class SimulatedNode(StorageNode):
+    """Headless StorageNode with latency_ms added to each message on the
+    connections it opens (to peers and to the coordinator), and inbound
+    connections dropped with probability drop_rate. Bandwidth is the node's
+    own send/recv throttle."""
+
+    def __init__(self, *args, latency_ms=0, drop_rate=0.0, seed=None, **kwargs):
+        self.latency = latency_ms / 1000
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.dropped = 0
+        super().__init__(*args, headless=True, **kwargs)
+
+    def open_connection(self, host, port):
+        s = super().open_connection(host, port)
+        return DelayedSocket(s, self.latency) if self.latency else s
+
+    def handle_connection(self, conn, recv_rate_kbps):
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            self.dropped += 1
+            conn.close()
+            return
+        super().handle_connection(conn, recv_rate_kbps)
+
+
+# =========================================================
+# In-Process Cluster
+# =========================================================
+class SimulatedCluster:
+    """The coordinator and every node share one process and talk over loopback."""
+
+    def __init__(self, bandwidth_kbps=0, latency_ms=0, drop_rate=0.0, storage_mb=1024, seed=1):
+        self.workdir = tempfile.mkdtemp(prefix="cloudkitchen-sim-")
+        self.bandwidth_kbps = bandwidth_kbps
+        self.latency_ms = latency_ms
+        self.drop_rate = drop_rate
+        self.storage_mb = storage_mb
+        self.seed = seed
+        self.nodes = []
+        self.down = set()  # node_ids that have been stopped
+
+        self.coordinator_socket = network_coordinator.bind_server("127.0.0.1", 0)
+        self.coordinator = self.coordinator_socket.getsockname()
+        threading.Thread(target=network_coordinator.serve_forever, args=(self.coordinator_socket,), daemon=True).start()
+
+    def add_node(self):
+        """Starts and registers one node. Returns (node, seconds to register)."""
+        node_id = f"sim{len(self.nodes) + 1}"
+        start = time.perf_counter()
+        node = SimulatedNode(
+            node_id, "127.0.0.1", 0, os.path.join(self.workdir, node_id),
+            self.storage_mb, self.bandwidth_kbps, self.bandwidth_kbps,
+            coordinator=self.coordinator,
+            latency_ms=self.latency_ms, drop_rate=self.drop_rate, seed=self.seed + len(self.nodes),
+        )
+        elapsed = time.perf_counter() - start
+        self.nodes.append(node)
+        return node, elapsed
+
+    def wait_for_membership(self, timeout):
+        """Waits until every live node sees the full peer list. Returns
+        (seconds waited, number of nodes with a stale view)."""
+        expected = len(self.nodes)
+        start = time.perf_counter()
+        while True:
+            stale = sum(1 for node in self.nodes
+                        if node.node_id not in self.down and len(node.peers) < expected)
+            elapsed = time.perf_counter() - start
+            if stale == 0 or elapsed > timeout:
+                return elapsed, stale
+            time.sleep(0.05)
+
+    def kill(self, node):
+        node.stop()
+        self.down.add(node.node_id)
+
+    def stop(self):
+        for node in self.nodes:
+            if node.node_id not in self.down:
+                node.stop()
+        try:
+            self.coordinator_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.coordinator_socket.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# =========================================================
+# Scenario
+# =========================================================
+def run_transfers(cluster, count, file_kb, rng):
+    """Random send + fetch pairs. Returns (send latencies, fetch latencies, failures).
+
+    Senders and fetchers are live nodes; stopped nodes can still be picked as
+    destinations, which is where injected failures show up."""
+    live = [node for node in cluster.nodes if node.node_id not in cluster.down]
+    send_times, fetch_times, failures = [], [], 0
+    for i in range(count):
+        src = rng.choice(live)
+        dst = rng.choice([node for node in cluster.nodes if node is not src])
+        file_id = src.add_data(f"simfile{i}", os.urandom(file_kb * 1024))
+        if file_id is None:
+            failures += 1
+            continue
+
+        start = time.perf_counter()
+        if src.send_file(f"{dst.host}:{dst.port}", file_id):
+            send_times.append(time.perf_counter() - start)
+        else:
+            failures += 1
+
+        fetcher = rng.choice(live)
+        start = time.perf_counter()
+        if fetcher is not src and fetcher.fetch_file(f"{src.host}:{src.port}", file_id) is not None:
+            fetch_times.append(time.perf_counter() - start)
+        elif fetcher is not src:
+            failures += 1
+    return send_times, fetch_times, failures
+
+
+def report(*lines):
+    # Node chatter goes to the redirected stdout; the report goes to the terminal.
+    for line in lines:
+        print(line, file=sys.__stdout__)
+    sys.__stdout__.flush()
+
+
+# ---------------------------------------------------------
+# Entry Point
+# ---------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a coordinator and many headless nodes in one process")
+    parser.add_argument("--nodes", type=int, default=200, help="Nodes to start (default: 200)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="One-way delay added to every message a node sends or gets a reply to (default: 0)")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="Probability an inbound message is dropped (default: 0)")
+    parser.add_argument("--bandwidth", type=int, default=0, help="Per-node send/recv rate in KBps, 0 = unthrottled (default: 0)")
+    parser.add_argument("--transfers", type=int, default=100, help="Random send+fetch rounds (default: 100)")
+    parser.add_argument("--file-kb", type=int, default=16, help="Size of each transferred file (default: 16)")
+    parser.add_argument("--kill", type=int, default=0, help="Nodes to stop before the transfer round (default: 0)")
+    parser.add_argument("--settle", type=float, default=30.0, help="Max seconds to wait for membership to converge (default: 30)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Show node and coordinator output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    rng = random.Random(args.seed)
+    cluster = SimulatedCluster(args.bandwidth, args.latency_ms, args.drop_rate, seed=args.seed)
+    try:
+        report(f"🚀 Coordinator on {cluster.coordinator[0]}:{cluster.coordinator[1]}, starting {args.nodes} nodes ...")
+
+        # Registration cost by cluster size, in tenths of the final size.
+        bucket = max(1, args.nodes // 10)
+        timings = []
+        for i in range(args.nodes):
+            _, elapsed = cluster.add_node()
+            timings.append(elapsed)
+            if (i + 1) % bucket == 0 or i + 1 == args.nodes:
+                summary = latency_summary(timings)
+                report(f"  {i + 1:>5} nodes  register p50 {summary['p50_ms']:8.2f}ms  p99 {summary['p99_ms']:8.2f}ms")
+                timings = []
+
+        waited, stale = cluster.wait_for_membership(args.settle)
+        report(f"🔄 Membership: {len(cluster.nodes) - stale}/{len(cluster.nodes)} nodes converged in {waited:.2f}s")
+
+        for node in rng.sample(cluster.nodes, min(args.kill, len(cluster.nodes))):
+            cluster.kill(node)
+        if args.kill:
+            report(f"💀 Stopped {len(cluster.down)} nodes")
+
+        send_times, fetch_times, failures = run_transfers(cluster, args.transfers, args.file_kb, rng)
+        sends, fetches = latency_summary(send_times), latency_summary(fetch_times)
+        report(
+            f"📤 send  ok {sends['count']:>5}  p50 {sends['p50_ms']:8.2f}ms  p99 {sends['p99_ms']:8.2f}ms",
+            f"📥 fetch ok {fetches['count']:>5}  p50 {fetches['p50_ms']:8.2f}ms  p99 {fetches['p99_ms']:8.2f}ms",
+            f"❌ failed {failures}, dropped inbound {sum(node.dropped for node in cluster.nodes)}",
+            f"🧵 threads {threading.active_count()}, " + (
+                f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MB" if resource
+                else "peak RSS unavailable on this platform"),
+        )
+    finally:
+        cluster.stop()
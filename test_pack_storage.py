@@ -0,0 +1,149 @@
+# test_pack_storage.py
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pack_storage import PackStore
+
+
+class PackStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.pack_dir = tempfile.mkdtemp(prefix="packstore-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.pack_dir, ignore_errors=True)
+
+    def reopen(self, store):
+        return PackStore(self.pack_dir, max_segment_mb=store.max_segment_bytes // (1024 * 1024))
+
+    def segment_files(self):
+        return sorted(os.listdir(self.pack_dir))
+
+    def test_overwrite_returns_latest_copy(self):
+        store = PackStore(self.pack_dir)
+        store.put("a", "a.txt", b"first")
+        store.put("a", "a.txt", b"second")
+        self.assertEqual(store.get("a"), b"second")
+
+        store = self.reopen(store)
+        self.assertEqual(store.get("a"), b"second")
+        self.assertEqual(store.files(), {"a": "a.txt"})
+
+    def test_restart_rebuilds_index_and_keeps_deletes(self):
+        store = PackStore(self.pack_dir)
+        store.put_many([("a", "a.txt", b"aaa"), ("b", "b.txt", b"bbb")])
+        self.assertTrue(store.delete("a"))
+        self.assertFalse(store.delete("a"))
+
+        store = self.reopen(store)
+        self.assertIsNone(store.get("a"))
+        self.assertEqual(store.get("b"), b"bbb")
+        self.assertEqual(store.total_size(), os.path.getsize(os.path.join(self.pack_dir, self.segment_files()[0])))
+
+    def test_restart_truncates_partial_record(self):
+        store = PackStore(self.pack_dir)
+        store.put("a", "a.txt", b"aaa")
+        size = store.total_size()
+        with open(os.path.join(self.pack_dir, self.segment_files()[0]), "ab") as f:
+            f.write(b"\x01\x00")
+
+        store = self.reopen(store)
+        self.assertEqual(store.get("a"), b"aaa")
+        self.assertEqual(store.total_size(), size)
+
+    def test_compaction_reclaims_dead_segments(self):
+        # ~1MB segments, so 40 x 64KB files span several of them.
+        store = PackStore(self.pack_dir, max_segment_mb=1, compact_ratio=0.5)
+        payloads = {f"f{i}": bytes([i]) * 64 * 1024 for i in range(40)}
+        for file_id, data in payloads.items():
+            store.put(file_id, file_id + ".bin", data)
+        for i in range(0, 30):
+            store.delete(f"f{i}")
+        before = store.total_size()
+
+        self.assertGreater(store.compact(), 0)
+        self.assertLess(store.total_size(), before)
+        for i in range(30, 40):
+            self.assertEqual(store.get(f"f{i}"), payloads[f"f{i}"])
+
+        # Nothing deleted comes back, and live files survive, after a restart.
+        store = self.reopen(store)
+        self.assertEqual(set(store.files()), {f"f{i}" for i in range(30, 40)})
+        for i in range(30, 40):
+            self.assertEqual(store.get(f"f{i}"), payloads[f"f{i}"])
+
+    def test_repeated_compaction_leaves_segments_alone(self):
+        # Kept tombstones reclaim nothing, so once the garbage is gone further
+        # passes must neither rewrite segments nor seal the active one.
+        store = PackStore(self.pack_dir, max_segment_mb=1, compact_ratio=0.5)
+        for i in range(40):
+            store.put(f"f{i}", f"f{i}.bin", bytes([i]) * 64 * 1024)
+        for i in range(20):
+            store.delete(f"f{i}")
+        store.compact()
+        segments = self.segment_files()
+
+        for i in range(5):
+            store.put(f"small{i}", f"small{i}.bin", b"s")
+            self.assertEqual(store.compact(), 0)
+            self.assertEqual(self.segment_files(), segments)
+
+        store = self.reopen(store)
+        self.assertEqual(store.compact(), 0)
+        self.assertEqual(self.segment_files(), segments)
+        self.assertEqual(len(store.files()), 25)
+        self.assertIsNone(store.get("f0"))
+
+    def test_write_during_compaction_wins(self):
+        store = PackStore(self.pack_dir, max_segment_mb=1, compact_ratio=0.5)
+        for i in range(20):
+            store.put(f"f{i}", f"f{i}.bin", b"old" * 20000)
+        for i in range(10):
+            store.delete(f"f{i}")
+
+        # Overwrite a live file while its segment is being copied.
+        original = store._encode_record
+        overwritten = []
+
+        def encode_and_overwrite(kind, file_id, filename, data=b""):
+            if file_id == "f15" and not overwritten:
+                overwritten.append(file_id)
+                store.put("f15", "f15.bin", b"new")
+            return original(kind, file_id, filename, data)
+
+        store._encode_record = encode_and_overwrite
+        store.compact()
+        store._encode_record = original
+        self.assertEqual(overwritten, ["f15"])
+        self.assertEqual(store.get("f15"), b"new")
+
+        store = self.reopen(store)
+        self.assertEqual(store.get("f15"), b"new")
+
+    def test_reads_continue_during_compaction(self):
+        store = PackStore(self.pack_dir, max_segment_mb=1, compact_ratio=0.1)
+        for i in range(40):
+            store.put(f"f{i}", f"f{i}.bin", bytes([i]) * 32 * 1024)
+        for i in range(0, 40, 2):
+            store.delete(f"f{i}")
+
+        errors = []
+
+        def read_loop():
+            for _ in range(200):
+                for i in range(1, 40, 2):
+                    if store.get(f"f{i}") != bytes([i]) * 32 * 1024:
+                        errors.append(i)
+
+        reader = threading.Thread(target=read_loop)
+        reader.start()
+        store.compact()
+        reader.join()
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,6 +6,19 @@ import json
 import hashlib
 import time
 
+import metrics
+from pack_storage import PackStore
+
+# --- Metrics ---
+BYTES_SENT = metrics.counter("node_bytes_sent", "Payload bytes written by send_full")
+BYTES_RECEIVED = metrics.counter("node_bytes_received", "Payload bytes read by recv_full")
+THROTTLE_WAIT = metrics.counter("node_throttle_wait_seconds", "Time slept to honour bandwidth limits", ("direction",))
+THROTTLE_WAIT_SEND = THROTTLE_WAIT.labels("send")
+THROTTLE_WAIT_RECV = THROTTLE_WAIT.labels("recv")
+ACTIVE_TRANSFERS = metrics.gauge("node_active_transfers", "File transfers in progress", ("node",))
+STORAGE_USED = metrics.gauge("node_storage_used_bytes", "Bytes stored by the node", ("node",))
+STORAGE_LIMIT = metrics.gauge("node_storage_limit_bytes", "Storage limit of the node", ("node",))
+
 # =========================================================
 # Shared Utility Functions with Bandwidth Throttling
 # =========================================================
@@ -21,6 +34,7 @@ def send_full(sock, payload: bytes, send_rate_kbps: int):
 
     chunk_size = 4096 
     total_sent = 0
+    total_waited = 0.0
     start_time = time.time()
     
     while total_sent < len(payload):
@@ -31,11 +45,15 @@ def send_full(sock, payload: bytes, send_rate_kbps: int):
             time_to_wait = (total_sent / rate_bps) - (time.time() - start_time)
             if time_to_wait > 0:
                 time.sleep(time_to_wait)
+                total_waited += time_to_wait
         
         # Send the chunk
         sock.sendall(chunk)
         total_sent += len(chunk)
 
+    BYTES_SENT.inc(total_sent)
+    THROTTLE_WAIT_SEND.inc(total_waited)
+
 
 def recv_full(sock, recv_rate_kbps: int) -> bytes:
     """Receives length-prefixed data with bandwidth throttling."""
@@ -50,6 +68,7 @@ def recv_full(sock, recv_rate_kbps: int) -> bytes:
 
     data = b""
     chunk_size = 4096
+    total_waited = 0.0
     start_time = time.time()
 
     while len(data) < size:
@@ -58,6 +77,7 @@ def recv_full(sock, recv_rate_kbps: int) -> bytes:
             time_to_wait = (len(data) / rate_bps) - (time.time() - start_time)
             if time_to_wait > 0:
                 time.sleep(time_to_wait)
+                total_waited += time_to_wait
         
         # Determine max read amount
         max_read = min(chunk_size, size - len(data))
@@ -66,6 +86,9 @@ def recv_full(sock, recv_rate_kbps: int) -> bytes:
         if not packet:
             break
         data += packet
+
+    BYTES_RECEIVED.inc(len(data))
+    THROTTLE_WAIT_RECV.inc(total_waited)
     return data
 
 
@@ -73,7 +96,8 @@ def recv_full(sock, recv_rate_kbps: int) -> bytes:
 # STORAGE NODE CLASS
 # =========================================================
 class StorageNode:
-    def __init__(self, node_id, host, port, storage_dir, max_storage_mb, send_rate_kbps, recv_rate_kbps):
+    def __init__(self, node_id, host, port, storage_dir, max_storage_mb, send_rate_kbps, recv_rate_kbps,
+                 pack_threshold_kb=64, headless=False, coordinator=("127.0.0.1", 9000)):
         self.node_id = node_id
         self.host = host
         self.port = port
@@ -89,28 +113,73 @@ class StorageNode:
 
         os.makedirs(self.storage_dir, exist_ok=True)
 
+        # Files at or below this size are appended to pack segments instead of
+        # being written as individual files.
+        self.pack_threshold_bytes = pack_threshold_kb * 1024
+        self.pack_dir = os.path.join(self.storage_dir, "packs")
+        self.pack_store = PackStore(self.pack_dir)
+        self.local_files.update(self.pack_store.files())
+        self.pack_store.start_compactor()
+
+        self.active_transfers = ACTIVE_TRANSFERS.labels(self.node_id)
+        STORAGE_USED.labels(self.node_id).set_function(self.get_current_storage_size)
+        STORAGE_LIMIT.labels(self.node_id).set_function(lambda: self.max_storage_bytes)
+
+        # Bind before registering so port 0 resolves to the real port first.
+        self.server_socket = self.bind_server()
         threading.Thread(target=self.start_server, daemon=True).start()
-        self.register_to_network()
-        self.cli_loop()
+        self.register_to_network(*coordinator)
+
+        # Headless nodes are driven through add_data/send_file/fetch_file instead.
+        if not headless:
+            self.cli_loop()
     
     # --- Resource Accounting ---
     def get_current_storage_size(self):
         """Calculates the current size of the storage directory."""
-        total_size = 0
+        # Pack segments keep their own byte count, so only loose files are walked.
+        total_size = self.pack_store.total_size()
         for dirpath, dirnames, filenames in os.walk(self.storage_dir):
+            if dirpath == self.storage_dir and "packs" in dirnames:
+                dirnames.remove("packs")
             for f in filenames:
                 fp = os.path.join(dirpath, f)
                 if not os.path.islink(fp):
                     total_size += os.path.getsize(fp)
         return total_size
 
+    # --- Local File Storage ---
+    def store_file(self, file_id, filename, file_data):
+        """Saves file data, packing it if it is small enough."""
+        if len(file_data) <= self.pack_threshold_bytes:
+            # A smaller copy replaces any loose one with the same id.
+            self.remove_loose_file(filename)
+            self.pack_store.put(file_id, filename, file_data)
+        else:
+            # A larger copy replaces any packed one with the same id.
+            self.pack_store.delete(file_id)
+            with open(os.path.join(self.storage_dir, filename), "wb") as f:
+                f.write(file_data)
+        self.local_files[file_id] = filename
+
+    def remove_loose_file(self, filename):
+        path = os.path.join(self.storage_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def read_file(self, file_id):
+        """Returns the stored bytes for a local file id."""
+        if self.pack_store.contains(file_id):
+            return self.pack_store.get(file_id)
+        with open(os.path.join(self.storage_dir, self.local_files[file_id]), "rb") as f:
+            return f.read()
+
     # ---------------------------------------------------------
     # Register with Coordinator
     # ---------------------------------------------------------
     def register_to_network(self, net_host="127.0.0.1", net_port=9000):
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((net_host, net_port))
+            s = self.open_connection(net_host, net_port)
 
             payload = {
                 "node_id": self.node_id,
@@ -142,24 +211,55 @@ class StorageNode:
     # ---------------------------------------------------------
     # Server
     # ---------------------------------------------------------
-    def start_server(self):
+    def bind_server(self):
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # Good practice for servers
         s.bind((self.host, self.port))
         s.listen()
+        self.port = s.getsockname()[1]
+        return s
 
+    def start_server(self):
         print(f"Server listening on {self.host}:{self.port}")
         print(f"Local Storage: {self.get_current_storage_size() // (1024 * 1024)}MB / {self.max_storage_bytes // (1024 * 1024)}MB")
 
         while True:
-            conn, addr = s.accept()
+            try:
+                conn, addr = self.server_socket.accept()
+            except OSError:
+                # stop() closed the listening socket
+                return
             # Pass the connection and the node's receive rate to the handler
             threading.Thread(target=self.handle_connection, args=(conn, self.recv_rate_kbps)).start()
 
+    def stop(self):
+        """Stops accepting connections and compacting (used by headless nodes)."""
+        # close() alone doesn't wake a thread blocked in accept() on Linux.
+        try:
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server_socket.close()
+        self.pack_store.stop_compactor()
+
+    def open_connection(self, host, port):
+        """Outgoing connections go through here so tests can inject faults."""
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.connect((host, port))
+        return s
+
     # ---------------------------------------------------------
     # Message Handling
     # ---------------------------------------------------------
     def handle_connection(self, conn, recv_rate_kbps):
+        self.active_transfers.inc()
+        try:
+            self.handle_message(conn, recv_rate_kbps)
+        finally:
+            self.active_transfers.dec()
+
+    def handle_message(self, conn, recv_rate_kbps):
+        recv_start = time.perf_counter()
         # Use the global recv_full with the node's receive rate
         data = recv_full(conn, recv_rate_kbps)
         if not data:
@@ -189,14 +289,14 @@ class StorageNode:
             
             if current_size + file_size > self.max_storage_bytes:
                 print(f"\n❌ REJECTED: Storage limit exceeded for file '{filename}'.")
+                metrics.record_span("transfer.receive", recv_start, header.get("trace_id"),
+                                    node=self.node_id, file_id=file_id, bytes=file_size, rejected=True)
                 conn.close()
                 return
 
-            save_path = os.path.join(self.storage_dir, filename)
-            with open(save_path, "wb") as f:
-                f.write(file_data)
-
-            self.local_files[file_id] = filename
+            self.store_file(file_id, filename, file_data)
+            metrics.record_span("transfer.receive", recv_start, header.get("trace_id"),
+                                node=self.node_id, file_id=file_id, bytes=file_size)
             
             current_size_mb = (self.get_current_storage_size() // (1024 * 1024))
             max_size_mb = self.max_storage_bytes // (1024 * 1024)
@@ -204,6 +304,78 @@ class StorageNode:
             conn.close()
             return
 
+        if data.startswith(b"[BATCH_TRANSFER]"):
+            header_raw, batch_data = data.split(b"<DATA>", 1)
+            header = json.loads(header_raw.replace(b"[BATCH_TRANSFER]", b""))
+            entries = header["files"]
+
+            # A short frame (peer disconnected mid-send) or a bad header would
+            # otherwise store files truncated or empty.
+            if sum(entry["size"] for entry in entries) != len(batch_data):
+                print(f"\n❌ REJECTED: Batch of {len(entries)} files does not match its header "
+                      f"({len(batch_data)} bytes received).")
+                metrics.record_span("transfer.receive_batch", recv_start, header.get("trace_id"),
+                                    node=self.node_id, files=len(entries), bytes=len(batch_data), rejected=True)
+                conn.close()
+                return
+
+            # --- STORAGE LIMIT CHECK (whole batch) ---
+            current_size = self.get_current_storage_size()
+            if current_size + len(batch_data) > self.max_storage_bytes:
+                print(f"\n❌ REJECTED: Storage limit exceeded for batch of {len(entries)} files.")
+                metrics.record_span("transfer.receive_batch", recv_start, header.get("trace_id"),
+                                    node=self.node_id, files=len(entries), bytes=len(batch_data), rejected=True)
+                conn.close()
+                return
+
+            packed = []
+            offset = 0
+            for entry in entries:
+                file_data = batch_data[offset : offset + entry["size"]]
+                offset += entry["size"]
+                if len(file_data) <= self.pack_threshold_bytes:
+                    packed.append((entry["file_id"], entry["filename"], file_data))
+                else:
+                    self.store_file(entry["file_id"], entry["filename"], file_data)
+
+            # Small files go to the pack in a single append pass, and only
+            # become visible once it has been written.
+            self.pack_store.put_many(packed)
+            for file_id, filename, _ in packed:
+                self.remove_loose_file(filename)
+                self.local_files[file_id] = filename
+            metrics.record_span("transfer.receive_batch", recv_start, header.get("trace_id"),
+                                node=self.node_id, files=len(entries), bytes=len(batch_data))
+
+            current_size_mb = (self.get_current_storage_size() // (1024 * 1024))
+            max_size_mb = self.max_storage_bytes // (1024 * 1024)
+            print(f"\n📥 Received batch of {len(entries)} files ({len(batch_data)} bytes). Storage: {current_size_mb}MB / {max_size_mb}MB")
+            conn.close()
+            return
+
+        if data.startswith(b"[FILE_REQUEST]"):
+            header = json.loads(data.replace(b"[FILE_REQUEST]", b""))
+            file_id = header["file_id"]
+
+            if file_id not in self.local_files:
+                send_full(conn, b"[NOT_FOUND]", self.send_rate_kbps)
+                conn.close()
+                return
+
+            filename = self.local_files[file_id]
+            response = (
+                b"[FILE_TRANSFER]"
+                + json.dumps({"file_id": file_id, "filename": filename}).encode()
+                + b"<DATA>"
+                + self.read_file(file_id)
+            )
+            send_full(conn, response, self.send_rate_kbps)
+            metrics.record_span("transfer.serve", recv_start, header.get("trace_id"),
+                                node=self.node_id, file_id=file_id, bytes=len(response))
+            print(f"\n📤 Served file '{filename}' (id={file_id})")
+            conn.close()
+            return
+
         conn.close()
 
     # ---------------------------------------------------------
@@ -212,33 +384,33 @@ class StorageNode:
     def add_file(self, filename, filepath):
         if not os.path.exists(filepath):
             print("❌ File not found.")
-            return
+            return None
 
+        try:
+            # Copy file contents
+            with open(filepath, "rb") as src:
+                return self.add_data(filename, src.read())
+        except Exception as e:
+            print(f"❌ Error copying file: {e}")
+            return None
+
+    def add_data(self, filename, file_data):
+        """Stores file_data under filename. Returns the file id, or None if it
+        does not fit in the storage limit."""
         file_id = hashlib.md5(filename.encode()).hexdigest()
         
         # --- STORAGE LIMIT CHECK FOR LOCAL FILE ---
-        file_size = os.path.getsize(filepath)
         current_size = self.get_current_storage_size()
         
-        if current_size + file_size > self.max_storage_bytes:
+        if current_size + len(file_data) > self.max_storage_bytes:
             current_size_mb = (current_size // (1024 * 1024))
             max_size_mb = self.max_storage_bytes // (1024 * 1024)
             print(f"❌ Cannot add file. Exceeds storage limit. Current: {current_size_mb}MB, Max: {max_size_mb}MB")
-            return
-            
-        dest = os.path.join(self.storage_dir, filename)
-
-        try:
-            # Copy file contents
-            with open(filepath, "rb") as src, open(dest, "wb") as out:
-                out.write(src.read())
-        except Exception as e:
-            print(f"❌ Error copying file: {e}")
-            return
+            return None
 
-
-        self.local_files[file_id] = filename
+        self.store_file(file_id, filename, file_data)
         print(f"✔ Added {filename} as file id {file_id}")
+        return file_id
 
     # ---------------------------------------------------------
     # Send File to Another Peer (CLI Command)
@@ -246,39 +418,159 @@ class StorageNode:
     def send_file(self, peer_addr, file_id):
         if file_id not in self.local_files:
             print("❌ File id not found.")
-            return
+            return False
 
         try:
             host, port = peer_addr.split(":")
             port = int(port)
         except ValueError:
             print("❌ Invalid peer address format. Use host:port")
-            return
+            return False
 
         filename = self.local_files[file_id]
-        file_path = os.path.join(self.storage_dir, filename)
-
-        with open(file_path, "rb") as f:
-            file_data = f.read()
+        file_data = self.read_file(file_id)
 
+        # The receiver records its span under the same trace id.
+        trace_id = metrics.new_trace_id()
         payload = (
             b"[FILE_TRANSFER]"
-            + json.dumps({"file_id": file_id, "filename": filename}).encode()
+            + json.dumps({"file_id": file_id, "filename": filename, "trace_id": trace_id}).encode()
             + b"<DATA>"
             + file_data
         )
 
+        start = time.perf_counter()
+        self.active_transfers.inc()
         try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.connect((host, port))
+            s = self.open_connection(host, port)
             
             # Use the global send_full with the node's send rate
             send_full(s, payload, self.send_rate_kbps)
             s.close()
 
+            metrics.record_span("transfer.send", start, trace_id, node=self.node_id, peer=peer_addr,
+                                file_id=file_id, bytes=len(file_data))
             print(f"📤 Sent file '{filename}' to {peer_addr} at ~{self.send_rate_kbps} KB/s")
+            return True
         except Exception as e:
+            metrics.record_span("transfer.send", start, trace_id, node=self.node_id, peer=peer_addr,
+                                file_id=file_id, error=e.__class__.__name__)
             print("❌ Error sending file:", e)
+            return False
+        finally:
+            self.active_transfers.dec()
+
+    # ---------------------------------------------------------
+    # Send Many Files in One Frame (CLI Command)
+    # ---------------------------------------------------------
+    def send_batch(self, peer_addr, file_ids):
+        missing = [fid for fid in file_ids if fid not in self.local_files]
+        if missing:
+            print(f"❌ File id(s) not found: {', '.join(missing)}")
+            return False
+
+        try:
+            host, port = peer_addr.split(":")
+            port = int(port)
+        except ValueError:
+            print("❌ Invalid peer address format. Use host:port")
+            return False
+
+        entries = []
+        chunks = []
+        for file_id in file_ids:
+            file_data = self.read_file(file_id)
+            entries.append({"file_id": file_id, "filename": self.local_files[file_id], "size": len(file_data)})
+            chunks.append(file_data)
+
+        trace_id = metrics.new_trace_id()
+        payload = (
+            b"[BATCH_TRANSFER]"
+            + json.dumps({"files": entries, "trace_id": trace_id}).encode()
+            + b"<DATA>"
+            + b"".join(chunks)
+        )
+
+        start = time.perf_counter()
+        self.active_transfers.inc()
+        try:
+            s = self.open_connection(host, port)
+            send_full(s, payload, self.send_rate_kbps)
+            s.close()
+
+            metrics.record_span("transfer.send_batch", start, trace_id, node=self.node_id, peer=peer_addr,
+                                files=len(file_ids), bytes=len(payload))
+            print(f"📤 Sent batch of {len(file_ids)} files to {peer_addr} at ~{self.send_rate_kbps} KB/s")
+            return True
+        except Exception as e:
+            metrics.record_span("transfer.send_batch", start, trace_id, node=self.node_id, peer=peer_addr,
+                                files=len(file_ids), error=e.__class__.__name__)
+            print("❌ Error sending batch:", e)
+            return False
+        finally:
+            self.active_transfers.dec()
+
+    # ---------------------------------------------------------
+    # Fetch File from Another Peer (CLI Command)
+    # ---------------------------------------------------------
+    def fetch_file(self, peer_addr, file_id):
+        """Downloads file_id from a peer and stores it locally. Returns the
+        file bytes, or None if the peer doesn't have it or it won't fit."""
+        try:
+            host, port = peer_addr.split(":")
+            port = int(port)
+        except ValueError:
+            print("❌ Invalid peer address format. Use host:port")
+            return None
+
+        trace_id = metrics.new_trace_id()
+        start = time.perf_counter()
+        self.active_transfers.inc()
+        try:
+            s = self.open_connection(host, port)
+            request = {"file_id": file_id, "trace_id": trace_id}
+            send_full(s, b"[FILE_REQUEST]" + json.dumps(request).encode(), self.send_rate_kbps)
+            response = recv_full(s, self.recv_rate_kbps)
+            s.close()
+        except Exception as e:
+            metrics.record_span("transfer.fetch", start, trace_id, node=self.node_id, peer=peer_addr,
+                                file_id=file_id, error=e.__class__.__name__)
+            print("❌ Error fetching file:", e)
+            return None
+        finally:
+            self.active_transfers.dec()
+
+        metrics.record_span("transfer.fetch", start, trace_id, node=self.node_id, peer=peer_addr,
+                            file_id=file_id, bytes=len(response))
+
+        if not response.startswith(b"[FILE_TRANSFER]"):
+            print(f"❌ {peer_addr} does not have file id {file_id}.")
+            return None
+
+        header_raw, file_data = response.split(b"<DATA>", 1)
+        header = json.loads(header_raw.replace(b"[FILE_TRANSFER]", b""))
+
+        if self.get_current_storage_size() + len(file_data) > self.max_storage_bytes:
+            print(f"❌ Cannot store '{header['filename']}'. Exceeds storage limit.")
+            return None
+
+        self.store_file(file_id, header["filename"], file_data)
+        print(f"📥 Fetched file '{header['filename']}' from {peer_addr}")
+        return file_data
+
+    # ---------------------------------------------------------
+    # Delete Local File (CLI Command)
+    # ---------------------------------------------------------
+    def delete_file(self, file_id):
+        if file_id not in self.local_files:
+            print("❌ File id not found.")
+            return
+
+        filename = self.local_files.pop(file_id)
+        # Either backend may hold a copy, so clear both.
+        self.pack_store.delete(file_id)
+        self.remove_loose_file(filename)
+        print(f"🗑 Deleted {filename} (id={file_id})")
 
     # ---------------------------------------------------------
     # CLI
@@ -310,6 +602,15 @@ class StorageNode:
             elif cmd[0] == "send" and len(cmd) == 3:
                 self.send_file(cmd[1], cmd[2])
 
+            elif cmd[0] == "sendbatch" and len(cmd) >= 3:
+                self.send_batch(cmd[1], cmd[2:])
+
+            elif cmd[0] == "fetch" and len(cmd) == 3:
+                self.fetch_file(cmd[1], cmd[2])
+
+            elif cmd[0] == "delfile" and len(cmd) == 2:
+                self.delete_file(cmd[1])
+
             elif cmd[0] == "peers":
                 print(self.peers)
 
@@ -318,7 +619,7 @@ class StorageNode:
                 break
 
             else:
-                print("Unknown command. Available: addfile <name> <path>, localfiles, storage, send <host:port> <file_id>, peers, quit")
+                print("Unknown command. Available: addfile <name> <path>, localfiles, storage, send <host:port> <file_id>, sendbatch <host:port> <file_id>..., fetch <host:port> <file_id>, delfile <file_id>, peers, quit")
 
 
 # ---------------------------------------------------------
@@ -334,9 +635,14 @@ if __name__ == "__main__":
     parser.add_argument("--storage", type=int, default=100, help="Maximum storage in MB (default: 100)")
     parser.add_argument("--sendrate", type=int, default=500, help="Send rate in KBps (Kilobytes per second) (default: 500)")
     parser.add_argument("--recvrate", type=int, default=500, help="Receive rate in KBps (Kilobytes per second) (default: 500)")
+    parser.add_argument("--packthreshold", type=int, default=64, help="Files up to this size in KB are stored in pack segments (default: 64)")
+    parser.add_argument("--metricsport", type=int, default=0, help="Serve /metrics and /traces on this port (default: off)")
 
     args = parser.parse_args()
 
+    if args.metricsport:
+        metrics.start_http_server(args.metricsport)
+
     storage_dir = f"storage/{args.node}"
     StorageNode(
         args.node, 
@@ -345,5 +651,6 @@ if __name__ == "__main__":
         storage_dir,
         args.storage,
         args.sendrate,
-        args.recvrate
+        args.recvrate,
+        args.packthreshold
     )
\ No newline at end of file